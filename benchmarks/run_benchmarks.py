@@ -0,0 +1,225 @@
+"""
+Benchmarks of the model (equations and aero tables), the simulation loop,
+the loaders and the writers.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks                   # writes bench_output.json
+    python -m benchmarks.run_benchmarks --quick           # fewer repeats
+    python -m benchmarks.run_benchmarks --baseline old.json --tolerance 0.2
+
+With --baseline every result is compared with the same key of the old file,
+the exit code is 1 if any benchmark is slower than (1 + tolerance) times
+the baseline.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from core.aircraft_model import AircraftModel
+from core.aero_database import AeroDatabase
+from core.simulation import Simulate
+from core import compiled
+from service.loader import LoadFiles
+from service.save import Save
+from service import config
+from service.mesh_cache import MeshCache, LEVELS
+
+AIRCRAFT = "configs/aircrafts/aircraft.jsonc"
+SIMULATIONS = [
+    "configs/simulation/simulation.jsonc",
+    "configs/simulation/sim_da.jsonc",
+    "configs/simulation/sim_no_eg.jsonc",
+]
+MESH = "data/meshes/ultimo2.stl"
+
+
+def timer(function, repeat, number=1):
+    """
+    Best and median time of one call, seconds (best of repeat runs of number calls)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start)/number)
+    return {"best_s": min(times), "median_s": float(np.median(times)), "repeat": repeat, "number": number}
+
+
+def bench_model(ac_params, sim_params, repeat):
+    model = AircraftModel(ac_params)
+    X = np.asarray(sim_params.X, dtype=float)
+    U = np.asarray(sim_params.U, dtype=float)
+    results = {"xdot_scalar": timer(lambda: model.xdot(X.copy(), U.copy()), repeat, number=200)}
+    rng = np.random.default_rng(0)
+    for n in (1, 100, 10000):
+        states = X + rng.normal(size=(n, 9))*0.01
+        timing = timer(lambda: model.xdot_batch(states, U), repeat, number=max(1, 2000//n))
+        timing["per_state_s"] = timing["best_s"]/n
+        results[f"xdot_batch_{n}"] = timing
+    return results
+
+
+def bench_simulate(ac_params, repeat):
+    results = {}
+    backends = ["numpy"] + (["numba"] if compiled.NUMBA_AVAILABLE else [])
+    for path in SIMULATIONS:
+        name = os.path.splitext(os.path.basename(path))[0]
+        sim_params = LoadFiles.simulation(path)
+        for backend in backends:
+            pars = dataclasses.replace(sim_params, show=0, backend=backend)
+            sim = Simulate(ac_params, pars)
+            sim.simulate() # warm up (numba compilation)
+            n_steps = len(sim.time_grid()) - 1
+            timing = timer(sim.simulate, repeat)
+            timing["steps"] = n_steps
+            timing["steps_per_s"] = n_steps/timing["best_s"]
+            results[f"simulate_{name}_{backend}"] = timing
+    return results
+
+
+def bench_tables(ac_params, sim_params, repeat):
+    """
+    Same aircraft with the aero tables of its equations (AeroDatabase.tabulate),
+    to compare with the xdot and simulate results of the equations
+    """
+    ac_tables = dataclasses.replace(ac_params, aero=AeroDatabase.tabulate(ac_params))
+    results = {}
+    for key, timing in bench_model(ac_tables, sim_params, repeat).items():
+        results[f"{key}_tables"] = timing
+    backends = ["numpy"] + (["numba"] if compiled.NUMBA_AVAILABLE else [])
+    for backend in backends:
+        sim = Simulate(ac_tables, dataclasses.replace(sim_params, show=0, backend=backend))
+        sim.simulate() # warm up (numba compilation)
+        n_steps = len(sim.time_grid()) - 1
+        timing = timer(sim.simulate, repeat)
+        timing["steps"] = n_steps
+        timing["steps_per_s"] = n_steps/timing["best_s"]
+        results[f"simulate_{backend}_tables"] = timing
+    return results
+
+
+def bench_io(ac_params, sim_params, repeat):
+    def parse(path):
+        config.clear_cache()
+        return LoadFiles._read_jsonc(path)
+
+    results = {
+        "read_jsonc_aircraft": timer(lambda: parse(AIRCRAFT), repeat, number=20),
+        "read_jsonc_simulation": timer(lambda: parse(SIMULATIONS[0]), repeat, number=20),
+        "load_aircraft_cached": timer(lambda: LoadFiles.aircraft(AIRCRAFT), repeat, number=20),
+        "load_simulation_cached": timer(lambda: LoadFiles.simulation(SIMULATIONS[0]), repeat, number=20),
+    }
+    if os.path.exists(MESH):
+        try:
+            timing = timer(lambda: MeshCache._build(MESH, LEVELS), repeat)
+            timing["bytes"] = os.path.getsize(MESH)
+            results["load_mesh_build"] = timing
+            with tempfile.TemporaryDirectory() as directory:
+                cache = MeshCache(directory)
+                cache.load(MESH)
+                results["load_mesh_cached"] = timer(lambda: cache.load(MESH), repeat)
+        except ImportError as error:
+            results["load_mesh_build"] = {"skipped": str(error)}
+    states = Simulate(ac_params, dataclasses.replace(sim_params, show=0)).simulate()
+    states = np.tile(states, (50, 1)) # ~90k rows
+    with tempfile.TemporaryDirectory() as directory:
+        for name, writer in (
+            ("s_sim_csv", lambda: Save.s_sim(states, directory=directory)),
+            ("s_bin", lambda: Save.s_bin(states, sim_params=sim_params, directory=directory)),
+        ):
+            timing = timer(writer, repeat)
+            timing["rows"] = len(states)
+            timing["rows_per_s"] = len(states)/timing["best_s"]
+            results[name] = timing
+        path = Save.s_bin(states, sim_params=sim_params, directory=directory)
+        results["load_states_bin"] = timer(lambda: np.array(LoadFiles._load_states_bin(path)[0]), repeat)
+        path = Save.s_sim(states, directory=directory)
+        results["load_states_csv"] = timer(lambda: LoadFiles._load_states(path), repeat)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": compiled.NUMBA_AVAILABLE,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the ratio new/old of the best time, return the slower keys
+    """
+    slower = []
+    for key, timing in results.items():
+        old = baseline.get("results", {}).get(key)
+        if not old or "best_s" not in old or "best_s" not in timing:
+            continue
+        ratio = timing["best_s"]/old["best_s"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  SLOWER"
+            slower.append(key)
+        print(f"{key:40s} {old['best_s']:.3e}s -> {timing['best_s']:.3e}s  x{ratio:.2f}{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_output.json", help="json file for the results")
+    parser.add_argument("--quick", action="store_true", help="3 repeats instead of 7")
+    parser.add_argument("--baseline", help="json of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown respect the baseline")
+    args = parser.parse_args(argv)
+    repeat = 3 if args.quick else 7
+
+    ac_params = LoadFiles.aircraft(AIRCRAFT)
+    sim_params = LoadFiles.simulation(SIMULATIONS[0])
+    results = {}
+    for name, bench in (
+        ("model", lambda: bench_model(ac_params, sim_params, repeat)),
+        ("simulate", lambda: bench_simulate(ac_params, repeat)),
+        ("tables", lambda: bench_tables(ac_params, sim_params, repeat)),
+        ("io", lambda: bench_io(ac_params, sim_params, repeat)),
+    ):
+        print(f"Running {name} benchmarks...")
+        results.update(bench())
+
+    report = {"environment": environment(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.tolerance)
+        if slower:
+            print(f"{len(slower)} benchmarks slower than the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
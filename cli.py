@@ -0,0 +1,69 @@
+"""
+Batch runner, simulate the aircraft x simulation configs of a manifest.
+
+    python cli.py run configs/manifests/example.jsonc
+    python cli.py run configs/manifests/example.jsonc --workers 4 --format simb
+    python cli.py run configs/manifests/example.jsonc --summary summary.json
+    python cli.py validate configs/manifests/example.jsonc
+
+See service/batch.py for the manifest fields. The exit code is 1 if any run
+fails, 2 if the manifest or a config is not valid.
+"""
+import argparse
+import json
+import sys
+import time
+
+from service.batch import Batch, FORMATS
+from service.config import ConfigError
+from service.loader import LoadFiles
+
+
+def validate(jobs):
+    """
+    Load every config of the jobs, raise ConfigError on the first bad one
+    """
+    for job in jobs:
+        LoadFiles.aircraft(job["aircraft"])
+        LoadFiles.simulation(job["simulation"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the manifest")
+    run.add_argument("manifest", help="jsonc manifest")
+    run.add_argument("--workers", type=int, default=1, help="parallel processes, 0 uses all the cores")
+    run.add_argument("--format", choices=FORMATS, help="output format, replaces the one of the manifest")
+    run.add_argument("--output", help="output directory, replaces the one of the manifest")
+    run.add_argument("--summary", help="json file for the results of each run")
+    check = commands.add_parser("validate", help="check the manifest and its configs without running")
+    check.add_argument("manifest", help="jsonc manifest")
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = LoadFiles._read_jsonc(args.manifest)
+        if args.command == "validate":
+            jobs = Batch.jobs(manifest)
+            validate(jobs)
+            print(f"{args.manifest}: {len(jobs)} runs, ok")
+            return 0
+        jobs = Batch.jobs(manifest, fmt=args.format, output=args.output)
+        validate(jobs)
+    except (ConfigError, OSError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    print(f"Running {len(jobs)} simulations...")
+    start = time.perf_counter()
+    results = Batch.run(jobs, max_workers=args.workers or None)
+    wall_time = time.perf_counter() - start
+    print(Batch.summary(results, wall_time))
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({"wall_time_s": wall_time, "runs": results}, f, indent=2)
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
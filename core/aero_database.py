@@ -0,0 +1,373 @@
+import json
+from bisect import bisect_right
+import numpy as np
+
+deg2rad = np.pi/180
+# Variables the tables can be given over, angles and deflections in rad
+AXES = ("alpha", "beta", "aileron", "elevator", "rudder")
+# Static coefficients: lift, drag and side force in the stability frame,
+# roll, pitch and yaw moments about the a.c. in the body frame
+COEFFICIENTS = ("cl", "cd", "cy", "c_roll", "c_pitch", "c_yaw")
+# Built databases, json of the config -> AeroDatabase
+_CACHE = {}
+
+
+class AeroTable:
+    """
+    Coefficient sampled on a grid of breakpoints over some of AXES, evaluated
+    with (multi)linear interpolation. Outside the breakpoints the values of
+    the border are used, there is no extrapolation.
+
+    Everything that does not depend on the query is computed here once: the
+    strides of the flat values, the offsets of the 2**d corners of a cell,
+    1/step of every interval (a single one for evenly spaced breakpoints,
+    then the cell is found without a search) and python lists for the
+    scalar queries of AircraftModel.xdot, where numpy calls cost more than
+    the interpolation itself.
+    """
+    def __init__(self, axes, breakpoints, values):
+        axes = tuple(axes)
+        for name in axes:
+            if name not in AXES:
+                raise ValueError(f'table axis {name} NOT IS SUPPORTED, use one of {list(AXES)}')
+        if len(set(axes)) != len(axes):
+            raise ValueError(f'table axes are repeated: {list(axes)}')
+        if len(breakpoints) != len(axes):
+            raise ValueError(f'table has {len(axes)} axes and {len(breakpoints)} lists of breakpoints')
+        self.axes = axes
+        self.breakpoints = []
+        for name, points in zip(axes, breakpoints):
+            points = np.array(points, dtype=float)
+            if points.ndim != 1 or len(points) < 2:
+                raise ValueError(f'breakpoints of {name} have to be a list of 2 or more values')
+            if not np.all(np.isfinite(points)) or np.any(np.diff(points) <= 0):
+                raise ValueError(f'breakpoints of {name} have to be finite and increasing')
+            points.flags.writeable = False
+            self.breakpoints.append(points)
+        self.values = np.array(values, dtype=float)
+        shape = tuple(len(points) for points in self.breakpoints)
+        if self.values.shape != shape:
+            raise ValueError(f'table values over {list(axes)} have to have shape {shape}, got {self.values.shape}')
+        if not np.all(np.isfinite(self.values)):
+            raise ValueError(f'table values over {list(axes)} are not finite')
+        self.values.flags.writeable = False
+
+        # Interpolation structures
+        d = len(axes)
+        self._flat = self.values.ravel()
+        self._strides = [int(np.prod(shape[j + 1:])) for j in range(d)]
+        self._inv_step = [1/np.diff(points) for points in self.breakpoints]
+        self._uniform = [
+            np.allclose(np.diff(points), points[1] - points[0], rtol=1e-9, atol=0)
+            for points in self.breakpoints
+        ]
+        bits = (np.arange(2**d)[:, None] >> np.arange(d)[::-1]) & 1 # corner k, axis j
+        self._bits = bits.astype(bool)
+        self._offsets = bits@np.array(self._strides, dtype=int) if d else np.zeros(1, dtype=int)
+        self._linear = d == 1 and len(self.breakpoints[0]) == 2
+        if self._linear:
+            # Straight line between the two breakpoints
+            self._slope = float((self._flat[1] - self._flat[0])*self._inv_step[0][0])
+        self._points_list = [points.tolist() for points in self.breakpoints]
+        self._inv_step_list = [inv_step.tolist() for inv_step in self._inv_step]
+        self._flat_list = self._flat.tolist()
+        self._corners = list(zip(self._bits.tolist(), self._offsets.tolist()))
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        A number (constant coefficient) or
+            {"axes":["alpha","elevator"],"breakpoints":[[...],[...]],"values":[[...],...]}
+        """
+        if isinstance(data, (int, float)) and not isinstance(data, bool):
+            return cls((), [], data)
+        if not isinstance(data, dict):
+            raise ValueError(f'a table has to be a number or an object, got {data!r}')
+        unknown = set(data) - {"axes", "breakpoints", "values"}
+        if unknown:
+            raise ValueError(f'unknown table fields {sorted(unknown)}')
+        if "values" not in data:
+            raise ValueError('a table needs "values"')
+        axes = data.get("axes", [])
+        if isinstance(axes, str):
+            axes = [axes]
+        breakpoints = data.get("breakpoints", [])
+        if len(axes) == 1 and len(breakpoints) and not isinstance(breakpoints[0], (list, tuple)):
+            breakpoints = [breakpoints]
+        return cls(axes, breakpoints, data["values"])
+
+    def to_dict(self):
+        return {
+            "axes": list(self.axes),
+            "breakpoints": [points.tolist() for points in self.breakpoints],
+            "values": self.values.tolist(),
+        }
+
+    def _cell(self, j, x):
+        """
+        Index of the interval of x in the breakpoints of axis j and the
+        position of x inside it (0 to 1)
+        """
+        points = self.breakpoints[j]
+        x = np.clip(x, points[0], points[-1])
+        last = len(points) - 2
+        if self._uniform[j]:
+            i = np.minimum(((x - points[0])*self._inv_step[j][0]).astype(int), last)
+        else:
+            i = np.minimum(np.searchsorted(points, x, side="right") - 1, last)
+        return i, (x - points[i])*self._inv_step[j][i]
+
+    def _evaluate_scalar(self, inputs):
+        """
+        evaluate for python (or numpy) floats, without numpy calls
+        """
+        if not self.axes:
+            return self._flat_list[0]
+        if self._linear:
+            low, high = self._points_list[0]
+            x = min(max(inputs[0], low), high)
+            return self._flat_list[0] + self._slope*(x - low)
+        base = 0
+        fractions = []
+        for j, x in enumerate(inputs):
+            points = self._points_list[j]
+            if x <= points[0]:
+                i, f = 0, 0.0
+            elif x >= points[-1]:
+                i, f = len(points) - 2, 1.0
+            else:
+                i = bisect_right(points, x) - 1
+                f = (x - points[i])*self._inv_step_list[j][i]
+            base += i*self._strides[j]
+            fractions.append(f)
+        values = self._flat_list
+        if len(fractions) == 1:
+            return values[base] + fractions[0]*(values[base + 1] - values[base])
+        result = 0.0
+        for bits, offset in self._corners:
+            weight = 1.0
+            for f, bit in zip(fractions, bits):
+                weight *= f if bit else 1 - f
+            result += weight*values[base + offset]
+        return result
+
+    def evaluate(self, *inputs):
+        """
+        Value at the inputs, one scalar or array for each of self.axes (in order)
+        """
+        d = len(self.axes)
+        if d == 0:
+            return self._flat_list[0]
+        if all(isinstance(x, float) for x in inputs):
+            return self._evaluate_scalar(inputs)
+        if d == 1:
+            points = self.breakpoints[0]
+            if self._linear:
+                return self._flat[0] + self._slope*(np.clip(inputs[0], points[0], points[1]) - points[0])
+            return np.interp(inputs[0], points, self._flat)
+        base = 0
+        fractions = []
+        for j, x in enumerate(inputs):
+            i, f = self._cell(j, x)
+            base = base + i*self._strides[j]
+            fractions.append(f)
+        result = 0.0
+        for bits, offset in zip(self._bits, self._offsets):
+            weight = 1.0
+            for f, bit in zip(fractions, bits):
+                weight = weight*(f if bit else 1 - f)
+            result = result + weight*self._flat[base + offset]
+        return result
+
+
+class AeroDatabase:
+    """
+    Aerodynamic coefficients of an aircraft from data (the "aero" block of
+    the aircraft config) instead of the equations of AircraftModel.
+
+    Every coefficient of COEFFICIENTS is the sum of its tables (buildup: a
+    base table over alpha plus the increments of beta and of each control).
+    The rate effects are linear in mac/Va*[p,q,r]:
+        cl += cl_q*q*mac/Va
+        [c_roll, c_pitch, c_yaw] += damping@[p,q,r]*mac/Va
+    Config:
+        "aero": {
+            "cl": [{"axes":["alpha"],"breakpoints":[...],"values":[...]},
+                   {"axes":["elevator"],"breakpoints":[-0.44,0.44],"values":[...]}],
+            "cd": {"axes":["alpha"],"breakpoints":[...],"values":[...]},
+            "cy": ..., "c_roll": ..., "c_pitch": ..., "c_yaw": ...,
+            "cl_q": 6.0, // optional, default from the tail geometry
+            "damping": [[...],[...],[...]] // optional, default from the tail geometry
+        }
+
+    With tables, the aircraft parameters used by the equations of the lift
+    and the tail are ignored: alpha_0 and n always, s_t and l_t when cl_q and
+    damping are both given (see unused_parameters). The mass, inertia,
+    s, mac and the engine positions still take effect.
+    """
+    def __init__(self, tables, cl_q=None, damping=None):
+        """
+        tables: dict coefficient -> list of AeroTable
+        cl_q: lift due to pitch rate, None for the default of the model
+        damping: 3x3 moments due to the rates, None for the default of the model
+        """
+        missing = [name for name in COEFFICIENTS if name not in tables]
+        if missing:
+            raise ValueError(f'aero tables are missing {missing}')
+        empty = [name for name in COEFFICIENTS if not len(tables[name])]
+        if empty:
+            raise ValueError(f'aero tables of {empty} are empty')
+        self.tables = {name: list(tables[name]) for name in COEFFICIENTS}
+        # Tables of each coefficient with the position of their axes in the inputs of evaluate
+        self._plan = [
+            [(table, tuple(AXES.index(axis) for axis in table.axes)) for table in self.tables[name]]
+            for name in COEFFICIENTS
+        ]
+        self.cl_q = None if cl_q is None else float(cl_q)
+        self.damping = None
+        if damping is not None:
+            self.damping = np.array(damping, dtype=float)
+            if self.damping.shape != (3, 3) or not np.all(np.isfinite(self.damping)):
+                raise ValueError(f'aero damping has to be a 3x3 matrix, got {damping}')
+            self.damping.flags.writeable = False
+
+    def unused_parameters(self):
+        """
+        Fields of AircraftParameters without effect on the forces when the
+        aircraft uses this database
+        """
+        unused = ["alpha_0", "n"]
+        if self.cl_q is not None and self.damping is not None:
+            unused += ["s_t", "l_t"]
+        return unused
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Database of the "aero" block of the config. Built once for each
+        different block, the same object is returned after that.
+        """
+        key = json.dumps(data, sort_keys=True)
+        database = _CACHE.get(key)
+        if database is None:
+            if not isinstance(data, dict):
+                raise ValueError(f'aero has to be an object, got {data!r}')
+            unknown = set(data) - set(COEFFICIENTS) - {"cl_q", "damping"}
+            if unknown:
+                raise ValueError(f'unknown aero fields {sorted(unknown)}')
+            tables = {}
+            for name in COEFFICIENTS:
+                if name not in data:
+                    continue
+                entries = data[name] if isinstance(data[name], (list, tuple)) else [data[name]]
+                try:
+                    tables[name] = [AeroTable.from_dict(entry) for entry in entries]
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f'{name}: {e}') from None
+            database = cls(tables, data.get("cl_q"), data.get("damping"))
+            _CACHE[key] = database
+        return database
+
+    def to_dict(self):
+        data = {name: [table.to_dict() for table in tables] for name, tables in self.tables.items()}
+        if self.cl_q is not None:
+            data["cl_q"] = self.cl_q
+        if self.damping is not None:
+            data["damping"] = self.damping.tolist()
+        return data
+
+    def evaluate(self, alpha, beta, aileron, elevator, rudder):
+        """
+        Static coefficients (cl, cd, cy, c_roll, c_pitch, c_yaw), scalars or
+        arrays with the shape of the inputs
+        """
+        inputs = (alpha, beta, aileron, elevator, rudder)
+        if all(isinstance(x, float) for x in inputs):
+            # One state (AircraftModel.xdot)
+            return tuple(
+                sum(table._evaluate_scalar([inputs[k] for k in index]) for table, index in tables)
+                for tables in self._plan
+            )
+        shape = np.shape(alpha)
+        values = []
+        for tables in self._plan:
+            total = 0.0
+            for table, index in tables:
+                total = total + table.evaluate(*[inputs[k] for k in index])
+            if np.shape(total) != shape:
+                total = np.full(shape, total) # constant coefficient
+            values.append(total)
+        return tuple(values)
+
+    @staticmethod
+    def tabulate(ac_params, alpha=None):
+        """
+        "aero" block that samples the equations of AircraftModel for
+        ac_params, to move an aircraft to tables or to check the database.
+        Only cl and cd are not linear in their variables, they are sampled on
+        alpha (default -20 to 40 deg every 0.5 deg, plus the stall break),
+        the other coefficients are exact.
+        """
+        from core.aircraft_model import ModelCoefficients, CONTROL_LOWER, CONTROL_UPPER
+        c = ModelCoefficients.compile(ac_params)
+        stall = 14.5*deg2rad
+        if alpha is None:
+            alpha = np.append(np.arange(-20, 40.25, 0.5)*deg2rad, stall + 1e-6)
+        alpha = np.unique(np.asarray(alpha, dtype=float))
+        epsilon = 0.25*(alpha - c.alpha_0)
+        cl_wb = np.where(
+            alpha <= stall,
+            c.n*(alpha - c.alpha_0),
+            15.212 - 155.2*alpha + 609.2*alpha**2 - 768.5*alpha**3
+        )
+        # Linear coefficients: 2 breakpoints at the limits of the variable
+        angle = [-np.pi, np.pi]
+        side = [-np.pi/2, np.pi/2]
+        aileron = [CONTROL_LOWER[0], CONTROL_UPPER[0]]
+        elevator = [CONTROL_LOWER[1], CONTROL_UPPER[1]]
+        rudder = [CONTROL_LOWER[2], CONTROL_UPPER[2]]
+
+        def table(axes, breakpoints, values):
+            return {
+                "axes": axes,
+                "breakpoints": [list(map(float, points)) for points in breakpoints],
+                "values": np.round(np.asarray(values, dtype=float), 12).tolist(),
+            }
+
+        def linear(axis, points, slope):
+            return table([axis], [points], slope*np.asarray(points))
+
+        alpha_2 = np.array(angle)
+        beta_2 = np.array(side)
+        return {
+            "cl": [
+                table(["alpha"], [alpha], cl_wb + c.cl_t_alpha*(alpha - epsilon)),
+                linear("elevator", elevator, c.cl_t_alpha),
+            ],
+            "cd": table(["alpha"], [alpha], 0.13 + 0.07*(c.n*alpha - 0.45)**2),
+            "cy": [linear("beta", side, -1.6), linear("rudder", rudder, 0.24)],
+            "c_roll": [
+                linear("beta", side, -1.4),
+                linear("aileron", aileron, c.cm_u[0, 0]),
+                linear("rudder", rudder, c.cm_u[0, 2]),
+            ],
+            "c_pitch": [
+                table(["alpha"], [alpha_2], -0.59 - c.cm_alpha_t*0.75*alpha_2 - c.cm_alpha_t*0.25*c.alpha_0),
+                linear("elevator", elevator, c.cm_u[1, 1]),
+            ],
+            "c_yaw": [
+                table(["alpha", "beta"], [alpha_2, beta_2], np.outer(1 - alpha_2*180/(np.pi*15), beta_2)),
+                linear("rudder", rudder, c.cm_u[2, 2]),
+            ],
+            "cl_q": float(c.cl_t_alpha*1.3*c.l_t/c.mac),
+            "damping": c.cm_x.tolist(),
+        }
+
+
+def aero_from_dict(data):
+    """
+    AeroDatabase of the aircraft config, None for the equations of the model
+    """
+    if data is None:
+        return None
+    return AeroDatabase.from_dict(data)
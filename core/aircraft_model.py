@@ -1,10 +1,165 @@
 import numpy as np
+from dataclasses import dataclass, fields
+from core.operations import Operations
+from core.atmosphere import Atmosphere
+from core.aero_database import aero_from_dict
+
+deg2rad = np.pi/180
+# Control limits: aleron, elevator, rudder +-25 deg, thrusts 0.5 to 10 deg
+CONTROL_LOWER = np.array([-25,-25,-25,0.5,0.5])*deg2rad
+CONTROL_UPPER = np.array([25,25,25,10,10])*deg2rad
+# Change it when the equations of the model change, cached results
+# (service/result_cache.py) of older versions are not used
+MODEL_VERSION = "3"
+
+
+@dataclass(frozen=True)
+class ModelCoefficients:
+    """
+    Constant part of the model for one set of AircraftParameters.
+
+    Compiled once by AircraftModel.coefficients and reused in every xdot call,
+    nothing here depends on the state or the controls.
+    """
+    m: float
+    s: float
+    mac: float
+    l_t: float
+    alpha_0: float
+    n: float
+    cl_t_alpha: float # s_t/s*3.1, tail lift slope referred to wing surface
+    cm_alpha_t: float # 3.1*s_t*l_t/(s*mac), tail pitch moment slope
+    cl_q: float # lift due to q*mac/Va, used with aero tables
+    inertia_body: np.ndarray # m*inertia_matrix
+    inertia_body_inv: np.ndarray
+    cm_x: np.ndarray # rate damping matrix, without the mac/Va factor
+    cm_u: np.ndarray # control moment matrix
+    r_cg_ac: np.ndarray # r_cg - r_ac
+    u_bar1: np.ndarray # engine 1 lever arm respect c.g
+    u_bar2: np.ndarray # engine 2 lever arm respect c.g
+    aero: object = None # AeroDatabase of the config, None for the equations
+
+    @classmethod
+    def compile(cls, ac_params):
+        """
+        Build the coefficients from AircraftParameters
+        """
+        m = ac_params.m
+        s = ac_params.s
+        mac = ac_params.mac
+        s_t = ac_params.s_t
+        l_t = ac_params.l_t
+        inertia_body = m*np.array(ac_params.inertia_matrix, dtype=float)
+        cm_x = np.array([
+            [-11,0,5],
+            [0,(-4.03*( s_t* l_t**2)/( s*mac**2)),0],
+            [1.7,0,-11.5]
+        ])
+        cm_u = np.array([
+            [-0.6,0,0.22],
+            [0,-3.1*( s_t* l_t/(s*mac)),0],
+            [0,0,-0.63]
+        ])
+        r_cg = np.array([0.23*mac,0,0.1*mac])
+        r_ac = np.array([0.12*mac,0,0])
+        u_bar1 = np.array([ac_params.x_apt1,ac_params.y_apt1,ac_params.z_apt1]) - r_cg
+        u_bar2 = np.array([ac_params.x_apt2,ac_params.y_apt2,ac_params.z_apt2]) - r_cg
+        cl_q = (s_t/ s*3.1)*1.3*l_t/mac
+        aero = aero_from_dict(getattr(ac_params,"aero",None))
+        if aero is not None:
+            # The control effects are in the tables, the rate effects too if given
+            cm_u = np.zeros((3,3))
+            if aero.damping is not None:
+                cm_x = np.array(aero.damping)
+            if aero.cl_q is not None:
+                cl_q = aero.cl_q
+        arrays = dict(
+            inertia_body=inertia_body,
+            inertia_body_inv=np.linalg.inv(inertia_body),
+            cm_x=cm_x,
+            cm_u=cm_u,
+            r_cg_ac=r_cg-r_ac,
+            u_bar1=u_bar1,
+            u_bar2=u_bar2,
+        )
+        for value in arrays.values():
+            value.flags.writeable = False
+        return cls(
+            m=m,
+            s=s,
+            mac=mac,
+            l_t=l_t,
+            alpha_0=ac_params.alpha_0,
+            n=ac_params.n,
+            cl_t_alpha=s_t/ s*3.1,
+            cm_alpha_t=(3.1* s_t* l_t)/( s*mac),
+            cl_q=cl_q,
+            aero=aero,
+            **arrays,
+        )
+
+
+    @classmethod
+    def stack(cls, ac_params_list):
+        """
+        Coefficients of several aircrafts in one bundle, every field gets a
+        leading axis of size N. Used by xdot_batch to evaluate N states, each
+        one with its own parameters (Monte Carlo dispersions). All of them
+        have to use the same aero tables (or none).
+        """
+        compiled = [cls.compile(ac_params) for ac_params in ac_params_list]
+        values = {}
+        for f in fields(cls):
+            if f.name == "aero":
+                if any(c.aero is not compiled[0].aero for c in compiled):
+                    raise ValueError('stack of aircrafts with different aero tables NOT IS SUPPORTED')
+                values[f.name] = compiled[0].aero
+                continue
+            value = np.stack([np.asarray(getattr(c, f.name), dtype=float) for c in compiled])
+            value.flags.writeable = False
+            values[f.name] = value
+        return cls(**values)
+
+    def take(self, indices):
+        """
+        Rows of a stacked bundle (see stack), e.g. to repeat each aircraft
+        for several states: coefficients.take(np.repeat(np.arange(N),k))
+        """
+        values = {"aero": self.aero}
+        for f in fields(self):
+            if f.name == "aero":
+                continue
+            value = np.asarray(getattr(self, f.name))[indices]
+            value.flags.writeable = False
+            values[f.name] = value
+        return type(self)(**values)
+
 
 class AircraftModel:
-    def __init__(self, ac_params):
+    def __init__(self, ac_params, atmosphere=None):
+        """
+        ac_params: AircraftParameters
+        atmosphere: Atmosphere (core/atmosphere.py), density, gravity and
+        wind used in every evaluation. None: sea level air without wind
+        """
         self.ac_params = ac_params
+        self.atmosphere = Atmosphere() if atmosphere is None else atmosphere
+        self._coefficients = None
+        self._compiled_for = (None, None)
+
+    @property
+    def coefficients(self):
+        """
+        ModelCoefficients of self.ac_params. Compiled on first use and again
+        only when ac_params (or any of its fields) was replaced.
+        """
+        key = (self.ac_params, self.ac_params.revision)
+        if self._compiled_for[0] is not key[0] or self._compiled_for[1] != key[1]:
+            self._coefficients = ModelCoefficients.compile(self.ac_params)
+            self._compiled_for = key
+        return self._coefficients
 
-    def xdot(self, state_var, control_var):
+    def xdot(self, state_var, control_var, t=0.0, altitude=0.0):
         """
         Inputs:
         -------
@@ -34,6 +189,12 @@ class AircraftModel:
 
         where body speed, m/s: x1,x2,x3  and angle rates, rad/s: x4,x5,x6
 
+        state_var can have 12 variables, the last 3 are the position north,
+        east, down (m): the altitude is -down and xdot adds their derivatives.
+
+        t: time, s, for the wind and gusts of the atmosphere
+        altitude: m, for the air density when state_var has 9 variables
+
         m: mass
         s: surface wing
         mac: mean aerodynamic chord
@@ -50,46 +211,35 @@ class AircraftModel:
         accel_body = [u_dot,v_dot,w_dot] m/s**2
         accel_angles = [p_dot,q_dot,r_dot] rad/s**2
         euler_rates_rate = [phi_dot,theta_dot,psi_dot] rad/s
+        (+ [north_dot,east_dot,down_dot] m/s with 12 state variables)
         """
-        ### deg2rad
-        deg2rad = np.pi/180
-
         # ----------- Extract variables and parameters -----------
-        # Mass,  inertia
-        m = self.ac_params.m
-        inertia_matrix = self.ac_params.inertia_matrix
-        # Geometric parameters
-        s = self.ac_params.s
-        mac = self.ac_params.mac
-        ## Tail parameters
-        s_t = self.ac_params.s_t
-        l_t = self.ac_params.l_t
-        ## Engine parameters
-        x_apt1 = self.ac_params.x_apt1
-        y_apt1 = self.ac_params.y_apt1
-        z_apt1 = self.ac_params.z_apt1
-        x_apt2 = self.ac_params.x_apt2
-        y_apt2 = self.ac_params.y_apt2
-        z_apt2 = self.ac_params.z_apt2
-        # Aerodynamic parameters
-        alpha_0 = self.ac_params.alpha_0
-        n = self.ac_params.n
-        
+        c = self.coefficients
+        atmosphere = self.atmosphere
+        m = c.m
+        s = c.s
+        mac = c.mac
+        l_t = c.l_t
+        alpha_0 = c.alpha_0
+        n = c.n
+
         # STEP 1
-        # Control limits
-        for i in range(len(control_var)):
-            if i < 3:
-                control_var[i] = np.clip(control_var[i],-25*deg2rad,25*deg2rad)
-            else:
-                control_var[i] = np.clip(control_var[i],0.5*deg2rad,10*deg2rad)
-        u1,u2,u3,u4,u5 = control_var
+        # Control limits (control_var is not modified)
+        u1,u2,u3,u4,u5 = np.clip(control_var,CONTROL_LOWER,CONTROL_UPPER)
         # STEP 2
         ## Variables intermedias
-        x1,x2,x3,x4,x5,x6,x7,x8,x9 = state_var
+        x1,x2,x3,x4,x5,x6,x7,x8,x9 = state_var[:9]
+        with_position = len(state_var) == 12
+        if with_position:
+            altitude = -state_var[11]
 
         body_speed = np.array([x1,x2,x3])
         angle_rates = np.array([x4,x5,x6])
-        euler_angles = np.array([x7,x8,x9])
+        # Speed respect the air
+        if atmosphere.has_wind or with_position:
+            c_body = Operations.body_rotation_matrix(x7,x8,x9)
+        if atmosphere.has_wind:
+            x1,x2,x3 = body_speed - c_body.T@atmosphere.wind(t,altitude)
 
         Va = np.sqrt(x1**2 + x2**2 + x3**2)
         if Va < 1e-6:
@@ -97,105 +247,68 @@ class AircraftModel:
 
         alpha = np.arctan2(x3,x1)
         beta = np.arcsin(np.clip(x2/Va, -1, 1))
-        rho = 1.225
+        rho = atmosphere.density(altitude)
         Q = 0.5*rho*Va**2
-        g = 9.81 # m/s2
-        
-
-        # Aircraft parameters, calcs from self.ac_params
-        innertia_body = m* inertia_matrix
+        g = atmosphere.g # m/s2
 
         # STEP 3
         ## Nondimensional Aero Forces coefficientes in Fs
-        if alpha <= 14.5/180*np.pi:  
-            cl_wb =  n*(alpha- alpha_0) # 
-        else:  ## Stall region
-            a1 = -155.2 
-            a2 = 609.2  
-            a3 = -768.5 
-            a0 = 15.212 
-            cl_wb = a0 + a1*alpha + a2*alpha**2 + a3*alpha**3
-
-        # Tail
-        deda = 0.25 
-        epsilon = deda*(alpha - alpha_0)
-        alpha_t = alpha-epsilon+u2+1.3*x5* l_t/Va
-        cl_t =  s_t/ s*3.1*alpha_t 
-        
-        # Forces
-        cl = cl_wb+cl_t
-        c_d = 0.13+0.07*( n*alpha-0.45)**2 
-        c_y = -1.6*beta+0.24*u3
+        if c.aero is not None:
+            ## From the tables of the aero database
+            cl,c_d,c_y,c_roll,c_pitch,c_yaw = c.aero.evaluate(alpha,beta,u1,u2,u3)
+            cl = cl+c.cl_q*x5*mac/Va
+        else:
+            if alpha <= 14.5/180*np.pi:  
+                cl_wb =  n*(alpha- alpha_0) # 
+            else:  ## Stall region
+                a1 = -155.2 
+                a2 = 609.2  
+                a3 = -768.5 
+                a0 = 15.212 
+                cl_wb = a0 + a1*alpha + a2*alpha**2 + a3*alpha**3
+
+            # Tail
+            deda = 0.25 
+            epsilon = deda*(alpha - alpha_0)
+            alpha_t = alpha-epsilon+u2+1.3*x5* l_t/Va
+            cl_t =  c.cl_t_alpha*alpha_t 
+            
+            # Forces
+            cl = cl_wb+cl_t
+            c_d = 0.13+0.07*( n*alpha-0.45)**2 
+            c_y = -1.6*beta+0.24*u3
         
         ## Aerodynamic Force in Fb
         non_dim_forces = [-c_d,c_y,-cl]
 
-        c_ws = np.array([[np.cos(beta),np.sin(beta),0],
-                        [-np.sin(beta),np.cos(beta),0],
-                        [0,0,1]])
-
         # STEP 4
         forces_s = Q* s*np.array(non_dim_forces)
-        c_bs = np.array([
-            [np.cos(alpha),0,-np.sin(alpha)],
-            [0,1,0],
-            [np.sin(alpha),0,np.cos(alpha)]
-        ])
+        c_bs = Operations.stability_to_body_matrices(alpha)
         forces_a = np.dot(c_bs, forces_s)
 
         # STEP 5
         ## Nondimensional Aero Moment Coefficient about AC in Fb
-        # Defube parametters for calc cm
-        n_bar = np.array([
-            -1.4*beta,
-            -0.59-(3.1* s_t* l_t)/( s*mac)*(alpha-epsilon),
-            (1-alpha*180/(np.pi*15))*beta
-        ])
-        cm_x = mac/Va*np.array([
-            [-11,0,5],
-            [0,(-4.03*( s_t* l_t**2)/( s*mac**2)),0],
-            [1.7,0,-11.5]
-        ])
-        cm_u = np.array([
-            [-0.6,0,0.22],
-            [0,-3.1*( s_t* l_t/(s*mac)),0],
-            [0,0,-0.63]
-        ])
-
-
-        cm_ac = n_bar +cm_x@(angle_rates)+cm_u@[u1,u2,u3]
+        if c.aero is not None:
+            n_bar = np.array([c_roll,c_pitch,c_yaw])
+        else:
+            n_bar = np.array([
+                -1.4*beta,
+                -0.59-c.cm_alpha_t*(alpha-epsilon),
+                (1-alpha*180/(np.pi*15))*beta
+            ])
+        cm_ac = n_bar +mac/Va*(c.cm_x@angle_rates)+c.cm_u@[u1,u2,u3]
         moments_ac = mac*cm_ac*Q* s
         
         # STEP 7
         ## Aero moment about cg in Fb
-        """
-        Define parammetters (r_cg,r_ac) for calculate mmoment cg in Fb
-        """
-        r_cg = np.array([0.23*mac,0,0.1*mac])
-        r_ac = np.array([0.12*mac,0,0])
-        moments_cg = moments_ac+np.cross(forces_a,(r_cg-r_ac))
+        moments_cg = moments_ac+np.cross(forces_a,c.r_cg_ac)
 
         # STEP 8S
         ## Propulsion effects
         f1 = (u4*m*g) 
         f2 = (u5*m*g)
-
-        """Define parammetters (u_bar1,u_bar2) for the propulsion effects"""
         f_e = f1+f2
-        u_bar1 = np.array([
-             x_apt1,
-             y_apt1,
-             z_apt1
-    ])
-        u_bar1 = u_bar1 - r_cg
-        u_bar2 = np.array([
-             x_apt2,
-             y_apt2,
-             z_apt2
-        ])
-        u_bar2 = u_bar2 - r_cg
-
-        m_ecg = np.cross(u_bar1,[f1,0,0]) + np.cross(u_bar2,[f2,0,0])
+        m_ecg = np.cross(c.u_bar1,[f1,0,0]) + np.cross(c.u_bar2,[f2,0,0])
 
         # STEP 9
         ## Gravity effects
@@ -211,15 +324,211 @@ class AircraftModel:
 
         accel_body = forces/m-np.cross(angle_rates,body_speed)
 
-        innertia_body_inv = np.linalg.inv(innertia_body)
-        accel_angles = innertia_body_inv@(moments-np.cross(angle_rates,innertia_body@angle_rates))
-        euler_derivate = np.array([
-            [1,np.sin(x7)*np.tan(x8),np.cos(x7)*np.tan(x8)],
-            [0,np.cos(x7),-np.sin(x7)],
-            [0,np.sin(x7)/np.cos(x8),np.cos(x7)/np.cos(x8)]
-        ])@angle_rates
+        innertia_body = c.inertia_body
+        accel_angles = c.inertia_body_inv@(moments-np.cross(angle_rates,innertia_body@angle_rates))
+        euler_derivate = Operations.euler_rates_matrices(x7,x8)@angle_rates
 
         x_dot_r = np.hstack((accel_body,accel_angles,euler_derivate))
-    
+        if with_position:
+            x_dot_r = np.hstack((x_dot_r,c_body@body_speed))
+
         x_dot_r = np.array(x_dot_r,dtype=float)
-        return x_dot_r
\ No newline at end of file
+        return x_dot_r
+
+    def xdot_batch(self, states, controls, coefficients=None, t=0.0, altitude=0.0):
+        """
+        Vectorized version of xdot. Evaluate N states in one pass.
+
+        Inputs:
+        -------
+        states: Array of state variables, shape (N,9), or (N,12) with the
+        position north, east, down (see xdot)
+
+        states[i] = [u,v,w,p,q,r,phi,theta,psi]
+
+        controls: Array of control variables, shape (N,5) or (5,)
+        (a single control vector is used for every state)
+
+        controls[i] = [u1,u2,u3,u4,u5]
+
+        coefficients: ModelCoefficients, by default self.coefficients. Use
+        ModelCoefficients.stack to give each state its own aircraft parameters.
+
+        t: time, s, for the wind of the atmosphere
+        altitude: m, scalar or shape (N,), used when the states have 9 columns
+
+        Output:
+        -------
+        xdot: Array shape (N,9) or (N,12), row i is equal to xdot(states[i],controls[i])
+
+        Note: controls are clipped like in xdot, but the input array is not modified.
+        """
+        # ----------- Extract variables and parameters -----------
+        c = self.coefficients if coefficients is None else coefficients
+        atmosphere = self.atmosphere
+        m = c.m
+        s = c.s
+        mac = c.mac
+        l_t = c.l_t
+        alpha_0 = c.alpha_0
+        n = c.n
+        # Column versions, broadcast against (N,3) with scalar or (N,) parameters
+        m_col = np.asarray(m)[...,None]
+        mac_col = np.asarray(mac)[...,None]
+
+        states = np.atleast_2d(np.asarray(states, dtype=float))
+        controls = np.asarray(controls, dtype=float)
+        controls = np.broadcast_to(controls, (states.shape[0], 5))
+
+        # STEP 1
+        # Control limits
+        u1,u2,u3,u4,u5 = np.clip(controls,CONTROL_LOWER,CONTROL_UPPER).T
+        # STEP 2
+        ## Variables intermedias
+        x1,x2,x3,x4,x5,x6,x7,x8,x9 = states[:,:9].T
+        with_position = states.shape[1] == 12
+        if with_position:
+            altitude = -states[:,11]
+
+        body_speed = states[:,0:3]
+        angle_rates = states[:,3:6]
+        # Speed respect the air
+        if atmosphere.has_wind or with_position:
+            c_body = Operations.body_rotation_matrices(x7,x8,x9)
+        if atmosphere.has_wind:
+            wind = atmosphere.wind(t,altitude)
+            x1,x2,x3 = (body_speed - np.einsum('...ji,...j->...i',c_body,wind)).T
+
+        Va = np.sqrt(x1**2 + x2**2 + x3**2)
+        Va = np.where(Va < 1e-6, 1e-6, Va)
+
+        alpha = np.arctan2(x3,x1)
+        beta = np.arcsin(np.clip(x2/Va, -1, 1))
+        rho = atmosphere.density(altitude)
+        Q = 0.5*rho*Va**2
+        g = atmosphere.g # m/s2
+
+        # STEP 3
+        ## Nondimensional Aero Forces coefficientes in Fs
+        if c.aero is not None:
+            ## From the tables of the aero database, all the states in one pass
+            cl,c_d,c_y,c_roll,c_pitch,c_yaw = c.aero.evaluate(alpha,beta,u1,u2,u3)
+            cl = cl+c.cl_q*x5*mac/Va
+        else:
+            a1 = -155.2
+            a2 = 609.2
+            a3 = -768.5
+            a0 = 15.212
+            cl_wb = np.where(
+                alpha <= 14.5/180*np.pi,
+                n*(alpha- alpha_0),
+                a0 + a1*alpha + a2*alpha**2 + a3*alpha**3 ## Stall region
+            )
+
+            # Tail
+            deda = 0.25
+            epsilon = deda*(alpha - alpha_0)
+            alpha_t = alpha-epsilon+u2+1.3*x5* l_t/Va
+            cl_t =  c.cl_t_alpha*alpha_t
+
+            # Forces
+            cl = cl_wb+cl_t
+            c_d = 0.13+0.07*( n*alpha-0.45)**2
+            c_y = -1.6*beta+0.24*u3
+
+        # STEP 4
+        ## Aerodynamic Force in Fb, forces_a = c_bs @ forces_s
+        forces_s = (Q* s)[:,None]*np.stack((-c_d,c_y,-cl),axis=1)
+        c_bs = Operations.stability_to_body_matrices(alpha)
+        forces_a = np.einsum('...ij,...j->...i',c_bs,forces_s)
+
+        # STEP 5
+        ## Nondimensional Aero Moment Coefficient about AC in Fb
+        if c.aero is not None:
+            n_bar = np.stack((c_roll,c_pitch,c_yaw),axis=1)
+        else:
+            n_bar = np.stack((
+                -1.4*beta,
+                -0.59-c.cm_alpha_t*(alpha-epsilon),
+                (1-alpha*180/(np.pi*15))*beta
+            ),axis=1)
+        cm_ac = (
+            n_bar
+            + (mac/Va)[:,None]*np.einsum('...ij,...j->...i',c.cm_x,angle_rates)
+            + np.einsum('...ij,...j->...i',c.cm_u,np.stack((u1,u2,u3),axis=1))
+        )
+        moments_ac = mac_col*cm_ac*(Q* s)[:,None]
+
+        # STEP 7
+        ## Aero moment about cg in Fb
+        moments_cg = moments_ac+np.cross(forces_a,c.r_cg_ac)
+
+        # STEP 8
+        ## Propulsion effects
+        f1 = (u4*m*g)
+        f2 = (u5*m*g)
+        f_e = f1+f2
+        u_bar1 = c.u_bar1
+        u_bar2 = c.u_bar2
+        # cross(u_bar,[f,0,0]) = [0, u_bar_z*f, -u_bar_y*f]
+        m_ecg = np.stack((
+            np.zeros_like(f1),
+            u_bar1[...,2]*f1 + u_bar2[...,2]*f2,
+            -u_bar1[...,1]*f1 - u_bar2[...,1]*f2
+        ),axis=1)
+
+        # STEP 9
+        ## Gravity effects
+        fg_bar = m_col*np.stack((
+            -g*np.sin(x8),
+            g*np.cos(x8)*np.sin(x7),
+            g*np.cos(x8)*np.cos(x7)
+        ),axis=1)
+
+        # STEP 10
+        forces = forces_a + fg_bar
+        forces[:,0] += f_e
+        moments =  m_ecg + moments_cg
+
+        accel_body = forces/m_col-np.cross(angle_rates,body_speed)
+
+        inertia_rates = np.einsum('...ij,...j->...i',c.inertia_body,angle_rates)
+        accel_angles = np.einsum(
+            '...ij,...j->...i',
+            c.inertia_body_inv,
+            moments-np.cross(angle_rates,inertia_rates)
+        )
+        euler_derivate = self.euler_rates(states)
+        if with_position:
+            position_rates = np.einsum('...ij,...j->...i',c_body,body_speed)
+            return np.hstack((accel_body,accel_angles,euler_derivate,position_rates))
+
+        return np.hstack((accel_body,accel_angles,euler_derivate))
+
+    @staticmethod
+    def kinematics(states):
+        """
+        Derivative of the variables after the rates: Euler angles, and the
+        position north, east, down when the states have 12 columns.
+        Used by the semi implicit integrator.
+
+        Output: Array shape (...,3) or (...,6)
+        """
+        euler_derivate = AircraftModel.euler_rates(states)
+        if states.shape[-1] != 12:
+            return euler_derivate
+        c_body = Operations.body_rotation_matrices(states[...,6],states[...,7],states[...,8])
+        position_rates = np.einsum('...ij,...j->...i',c_body,states[...,0:3])
+        return np.concatenate((euler_derivate,position_rates),axis=-1)
+
+    @staticmethod
+    def euler_rates(states):
+        """
+        Kinematic part of the model, [phi_dot,theta_dot,psi_dot] from the
+        angle rates and the Euler angles.
+
+        states: Array of state variables, shape (...,9)
+        Output: Array shape (...,3)
+        """
+        E = Operations.euler_rates_matrices(states[...,6],states[...,7])
+        return np.einsum('...ij,...j->...i',E,states[...,3:6])
@@ -0,0 +1,189 @@
+import numpy as np
+
+# Sea level values of the original model
+RHO_0 = 1.225 # kg/m3
+G = 9.81 # m/s2
+
+
+class Gust:
+    """
+    Discrete "1 - cos" gust: the wind changes by amplitude (north, east,
+    down, m/s) and back in duration seconds starting at start
+    """
+    def __init__(self, start, duration, amplitude):
+        if duration <= 0:
+            raise ValueError(f'gust duration has to be > 0, got {duration}')
+        self.start = start
+        self.duration = duration
+        self.amplitude = np.asarray(amplitude, dtype=float)
+        if self.amplitude.shape != (3,):
+            raise ValueError(f'gust amplitude has to be [north, east, down], got {amplitude}')
+
+    def wind(self, t):
+        t = np.asarray(t, dtype=float)
+        phase = (t - self.start)/self.duration
+        active = (phase >= 0) & (phase <= 1)
+        factor = np.where(active, (1 - np.cos(2*np.pi*phase))/2, 0.0)
+        return factor[..., None]*self.amplitude
+
+
+class Atmosphere:
+    """
+    Air around the A/C, queried by AircraftModel at every evaluation.
+
+    This base class is the air of the original model: constant density
+    (sea level) at any altitude, plus an optional steady wind and gusts.
+    Every method takes scalars or arrays (batched states).
+    """
+    def __init__(self, rho=RHO_0, g=G, wind=None, gusts=()):
+        """
+        rho: density, kg/m3
+        g: gravity, m/s2
+        wind: steady wind [north, east, down] m/s (velocity of the air)
+        gusts: list of Gust, or of dicts {"start","duration","amplitude"}
+        """
+        self.rho = rho
+        self.g = g
+        self.steady_wind = np.zeros(3) if wind is None else np.asarray(wind, dtype=float)
+        if self.steady_wind.shape != (3,):
+            raise ValueError(f'wind has to be [north, east, down], got {wind}')
+        self.gusts = [Gust(**gust) if isinstance(gust, dict) else gust for gust in gusts]
+        self.has_wind = bool(np.any(self.steady_wind) or self.gusts)
+
+    @property
+    def varies_with_altitude(self):
+        return False
+
+    @property
+    def is_default(self):
+        """
+        True for the sea level air without wind of the original model (the
+        numba kernels only support this one)
+        """
+        return type(self) is Atmosphere and self.rho == RHO_0 and self.g == G and not self.has_wind
+
+    def density(self, altitude):
+        if np.ndim(altitude) == 0:
+            return self.rho
+        return np.full(np.shape(altitude), self.rho)
+
+    def wind(self, t, altitude=0.0):
+        """
+        Velocity of the air [north, east, down], m/s, shape (...,3)
+        """
+        shape = np.broadcast(np.asarray(t), np.asarray(altitude)).shape
+        wind = np.broadcast_to(self.steady_wind, shape + (3,)).copy()
+        for gust in self.gusts:
+            wind += gust.wind(t)
+        return wind
+
+    def still(self):
+        """
+        Same air without wind and gusts (trim is respect the air mass)
+        """
+        return Atmosphere(self.rho, self.g)
+
+    def to_dict(self):
+        return {
+            "model": "constant",
+            "rho": self.rho,
+            "g": self.g,
+            "wind": self.steady_wind.tolist(),
+            "gusts": [
+                {"start": g.start, "duration": g.duration, "amplitude": g.amplitude.tolist()}
+                for g in self.gusts
+            ],
+        }
+
+
+class ISA(Atmosphere):
+    """
+    International Standard Atmosphere, troposphere and lower stratosphere
+    (-500 to 20000 m). Temperature, pressure, density and speed of sound
+    are tabulated once every STEP meters, the queries interpolate the table
+    (np.interp), no exponentials per evaluation. Above the table the last
+    values are used.
+    """
+    T0 = 288.15 # K
+    P0 = 101325.0 # Pa
+    LAPSE = -0.0065 # K/m, up to 11000 m
+    H_TROPOPAUSE = 11000.0
+    R = 287.05287 # J/(kg K)
+    GAMMA = 1.4
+    G0 = 9.80665 # m/s2, of the ISA definition
+    H_MIN = -500.0
+    H_MAX = 20000.0
+    STEP = 10.0
+    _table = None
+
+    def __init__(self, g=G, wind=None, gusts=()):
+        super().__init__(rho=RHO_0, g=g, wind=wind, gusts=gusts)
+
+    @classmethod
+    def table(cls):
+        """
+        (altitude, temperature, pressure, density, speed of sound), built once
+        """
+        if cls._table is None:
+            h = np.arange(cls.H_MIN, cls.H_MAX + cls.STEP/2, cls.STEP)
+            T11 = cls.T0 + cls.LAPSE*cls.H_TROPOPAUSE
+            p11 = cls.P0*(T11/cls.T0)**(-cls.G0/(cls.LAPSE*cls.R))
+            troposphere = h <= cls.H_TROPOPAUSE
+            T = np.where(troposphere, cls.T0 + cls.LAPSE*h, T11)
+            p = np.where(
+                troposphere,
+                cls.P0*(T/cls.T0)**(-cls.G0/(cls.LAPSE*cls.R)),
+                p11*np.exp(-cls.G0*(h - cls.H_TROPOPAUSE)/(cls.R*T11)),
+            )
+            rho = p/(cls.R*T)
+            a = np.sqrt(cls.GAMMA*cls.R*T)
+            cls._table = tuple(np.ascontiguousarray(v) for v in (h, T, p, rho, a))
+            for value in cls._table:
+                value.flags.writeable = False
+        return cls._table
+
+    @property
+    def varies_with_altitude(self):
+        return True
+
+    def _lookup(self, altitude, column):
+        table = self.table()
+        return np.interp(altitude, table[0], table[column])
+
+    def temperature(self, altitude):
+        return self._lookup(altitude, 1)
+
+    def pressure(self, altitude):
+        return self._lookup(altitude, 2)
+
+    def density(self, altitude):
+        return self._lookup(altitude, 3)
+
+    def speed_of_sound(self, altitude):
+        return self._lookup(altitude, 4)
+
+    def still(self):
+        return ISA(self.g)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["model"] = "isa"
+        del data["rho"]
+        return data
+
+
+MODELS = {"constant": Atmosphere, "isa": ISA}
+
+
+def atmosphere_from_dict(data):
+    """
+    Atmosphere of the simulation config, None is the sea level air
+        {"model":"isa","wind":[0,5,0],"gusts":[{"start":30,"duration":2,"amplitude":[0,0,-6]}]}
+    """
+    if data is None:
+        return Atmosphere()
+    data = dict(data)
+    kind = data.pop("model", "constant")
+    if kind not in MODELS:
+        raise ValueError(f'atmosphere model {kind} NOT IS SUPPORTED, use one of {list(MODELS)}')
+    return MODELS[kind](**data)
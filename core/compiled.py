@@ -0,0 +1,324 @@
+"""
+Compiled (numba) backend of the simulation.
+
+The same equations of AircraftModel.xdot and the fixed step integrators
+(euler, semi_implicit, rk4) in nopython kernels, the whole integration loop
+runs without going back to python. The aero tables (core/aero_database.py)
+are interpolated in the kernel too. Selected with backend = "numba" in the
+simulation config. numba is optional, without it NUMBA_AVAILABLE is False
+and Simulate uses the numpy path. Importing this module imports numba, so
+Simulate only imports it when the numba backend is selected.
+"""
+import numpy as np
+from core.aero_database import AXES, COEFFICIENTS
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Keep the module importable, the kernels are not used without numba
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+METHODS = {"euler": 0, "semi_implicit": 1, "rk4": 2}
+# Row of each table in pack_aero: coefficient, number of axes, axes, number
+# of breakpoints of each axis, offset of the breakpoints and of the values
+MAX_AXES = len(AXES)
+TABLE_ROW = 4 + 2*MAX_AXES
+# Scratch of _xdot: inputs of the tables, coefficients, fractions of the cell
+WORK_SIZE = MAX_AXES + len(COEFFICIENTS) + MAX_AXES
+EVALS_PER_STEP = {"euler": 1, "semi_implicit": 1, "rk4": 4}
+
+
+def pack(c):
+    """
+    ModelCoefficients as one flat float64 array, the layout read by _xdot
+    """
+    return np.concatenate((
+        [c.m, c.s, c.mac, c.l_t, c.alpha_0, c.n, c.cl_t_alpha, c.cm_alpha_t],
+        np.ravel(c.inertia_body),
+        np.ravel(c.inertia_body_inv),
+        np.ravel(c.cm_x),
+        np.ravel(c.cm_u),
+        c.r_cg_ac,
+        c.u_bar1,
+        c.u_bar2,
+        [c.cl_q],
+    )).astype(np.float64)
+
+
+def pack_aero(aero):
+    """
+    AeroDatabase as (index, data) arrays, the layout read by _aero. No
+    tables (rows) for the equations of the model (aero None).
+    """
+    rows = []
+    data = []
+    if aero is not None:
+        for k, name in enumerate(COEFFICIENTS):
+            for table in aero.tables[name]:
+                d = len(table.axes)
+                row = np.zeros(TABLE_ROW, dtype=np.int64)
+                row[0] = k
+                row[1] = d
+                for j, axis in enumerate(table.axes):
+                    row[2 + j] = AXES.index(axis)
+                    row[2 + MAX_AXES + j] = len(table.breakpoints[j])
+                row[2 + 2*MAX_AXES] = sum(len(v) for v in data)
+                data.extend(table.breakpoints)
+                row[3 + 2*MAX_AXES] = sum(len(v) for v in data)
+                data.append(np.ravel(table.values))
+                rows.append(row)
+    index = np.array(rows, dtype=np.int64).reshape(len(rows), TABLE_ROW)
+    values = np.concatenate(data).astype(np.float64) if data else np.zeros(0)
+    return index, values
+
+
+@njit(cache=True)
+def _aero(ai, af, work):
+    """
+    Static coefficients of the aero tables, AeroDatabase.evaluate. The
+    inputs (alpha, beta, aileron, elevator, rudder) are read from work[0:5],
+    the coefficients written in work[5:11], work[11:16] is scratch.
+    """
+    n_axes = 5
+    n_coef = 6
+    for k in range(n_coef):
+        work[n_axes + k] = 0.0
+    fractions = n_axes + n_coef
+    for t in range(ai.shape[0]):
+        d = ai[t, 1]
+        bp = ai[t, 2 + 2*n_axes]
+        base = 0
+        for j in range(d):
+            n = ai[t, 2 + n_axes + j]
+            x = work[ai[t, 2 + j]]
+            # Cell of x, border values outside the breakpoints
+            if x <= af[bp]:
+                i = 0
+                f = 0.0
+            elif x >= af[bp + n - 1]:
+                i = n - 2
+                f = 1.0
+            else:
+                lo = 0
+                hi = n - 1
+                while hi - lo > 1:
+                    mid = (lo + hi)//2
+                    if af[bp + mid] <= x:
+                        lo = mid
+                    else:
+                        hi = mid
+                i = lo
+                f = (x - af[bp + i])/(af[bp + i + 1] - af[bp + i])
+            stride = 1
+            for jj in range(j + 1, d):
+                stride *= ai[t, 2 + n_axes + jj]
+            base += i*stride
+            work[fractions + j] = f
+            bp += n
+        # Multilinear interpolation, sum of the 2**d corners of the cell
+        value = 0.0
+        for corner in range(2**d):
+            weight = 1.0
+            offset = 0
+            stride = 1
+            for j in range(d - 1, -1, -1):
+                f = work[fractions + j]
+                if (corner >> (d - 1 - j)) & 1:
+                    weight *= f
+                    offset += stride
+                else:
+                    weight *= 1 - f
+                stride *= ai[t, 2 + n_axes + j]
+            value += weight*af[ai[t, 3 + 2*n_axes] + base + offset]
+        work[n_axes + ai[t, 0]] += value
+
+
+@njit(cache=True)
+def _xdot(x, u, c, ai, af, work, out):
+    """
+    AircraftModel.xdot for one state, c from pack, (ai, af) from pack_aero,
+    work scratch of WORK_SIZE, result written in out
+    """
+    deg2rad = np.pi/180
+    m = c[0]
+    s = c[1]
+    mac = c[2]
+    l_t = c[3]
+    alpha_0 = c[4]
+    n = c[5]
+    cl_t_alpha = c[6]
+    cm_alpha_t = c[7]
+    I = c[8:17]
+    I_inv = c[17:26]
+    cm_x = c[26:35]
+    cm_u = c[35:44]
+    r = c[44:47]
+    ub1 = c[47:50]
+    ub2 = c[50:53]
+    cl_q = c[53]
+
+    # Control limits
+    u1 = min(max(u[0], -25*deg2rad), 25*deg2rad)
+    u2 = min(max(u[1], -25*deg2rad), 25*deg2rad)
+    u3 = min(max(u[2], -25*deg2rad), 25*deg2rad)
+    u4 = min(max(u[3], 0.5*deg2rad), 10*deg2rad)
+    u5 = min(max(u[4], 0.5*deg2rad), 10*deg2rad)
+
+    x1, x2, x3, x4, x5, x6, x7, x8 = x[0], x[1], x[2], x[3], x[4], x[5], x[6], x[7]
+    Va = np.sqrt(x1**2 + x2**2 + x3**2)
+    if Va < 1e-6:
+        Va = 1e-6
+    alpha = np.arctan2(x3, x1)
+    beta = np.arcsin(min(max(x2/Va, -1.0), 1.0))
+    rho = 1.225
+    Q = 0.5*rho*Va**2
+    g = 9.81
+
+    # Aero forces
+    if ai.shape[0] > 0:
+        work[0] = alpha
+        work[1] = beta
+        work[2] = u1
+        work[3] = u2
+        work[4] = u3
+        _aero(ai, af, work)
+        cl = work[5] + cl_q*x5*mac/Va
+        c_d = work[6]
+        c_y = work[7]
+        nb0 = work[8]
+        nb1 = work[9]
+        nb2 = work[10]
+    else:
+        if alpha <= 14.5/180*np.pi:
+            cl_wb = n*(alpha - alpha_0)
+        else:
+            cl_wb = 15.212 - 155.2*alpha + 609.2*alpha**2 - 768.5*alpha**3
+        epsilon = 0.25*(alpha - alpha_0)
+        alpha_t = alpha - epsilon + u2 + 1.3*x5*l_t/Va
+        cl = cl_wb + cl_t_alpha*alpha_t
+        c_d = 0.13 + 0.07*(n*alpha - 0.45)**2
+        c_y = -1.6*beta + 0.24*u3
+        nb0 = -1.4*beta
+        nb1 = -0.59 - cm_alpha_t*(alpha - epsilon)
+        nb2 = (1 - alpha*180/(np.pi*15))*beta
+    qs = Q*s
+    fs0 = -qs*c_d
+    fs1 = qs*c_y
+    fs2 = -qs*cl
+    ca = np.cos(alpha)
+    sa = np.sin(alpha)
+    fa0 = ca*fs0 - sa*fs2
+    fa1 = fs1
+    fa2 = sa*fs0 + ca*fs2
+
+    # Aero moments
+    k = mac/Va
+    n0 = nb0 + k*(cm_x[0]*x4 + cm_x[1]*x5 + cm_x[2]*x6) + cm_u[0]*u1 + cm_u[1]*u2 + cm_u[2]*u3
+    n1 = (nb1 + k*(cm_x[3]*x4 + cm_x[4]*x5 + cm_x[5]*x6)
+          + cm_u[3]*u1 + cm_u[4]*u2 + cm_u[5]*u3)
+    n2 = (nb2 + k*(cm_x[6]*x4 + cm_x[7]*x5 + cm_x[8]*x6)
+          + cm_u[6]*u1 + cm_u[7]*u2 + cm_u[8]*u3)
+    qsc = mac*qs
+    mx = qsc*n0 + (fa1*r[2] - fa2*r[1])
+    my = qsc*n1 + (fa2*r[0] - fa0*r[2])
+    mz = qsc*n2 + (fa0*r[1] - fa1*r[0])
+
+    # Propulsion
+    f1 = u4*m*g
+    f2 = u5*m*g
+    my += ub1[2]*f1 + ub2[2]*f2
+    mz += -ub1[1]*f1 - ub2[1]*f2
+
+    # Gravity and totals
+    sphi = np.sin(x7)
+    cphi = np.cos(x7)
+    sth = np.sin(x8)
+    cth = np.cos(x8)
+    out[0] = (fa0 - m*g*sth + f1 + f2)/m - (x5*x3 - x6*x2)
+    out[1] = (fa1 + m*g*cth*sphi)/m - (x6*x1 - x4*x3)
+    out[2] = (fa2 + m*g*cth*cphi)/m - (x4*x2 - x5*x1)
+
+    h0 = I[0]*x4 + I[1]*x5 + I[2]*x6
+    h1 = I[3]*x4 + I[4]*x5 + I[5]*x6
+    h2 = I[6]*x4 + I[7]*x5 + I[8]*x6
+    e0 = mx - (x5*h2 - x6*h1)
+    e1 = my - (x6*h0 - x4*h2)
+    e2 = mz - (x4*h1 - x5*h0)
+    out[3] = I_inv[0]*e0 + I_inv[1]*e1 + I_inv[2]*e2
+    out[4] = I_inv[3]*e0 + I_inv[4]*e1 + I_inv[5]*e2
+    out[5] = I_inv[6]*e0 + I_inv[7]*e1 + I_inv[8]*e2
+
+    _euler_rates(x, out)
+
+
+@njit(cache=True)
+def _euler_rates(x, out):
+    """
+    AircraftModel.euler_rates, written in out[6:9]
+    """
+    sphi = np.sin(x[6])
+    cphi = np.cos(x[6])
+    aux = sphi*x[4] + cphi*x[5]
+    out[6] = x[3] + aux*np.tan(x[7])
+    out[7] = cphi*x[4] - sphi*x[5]
+    out[8] = aux/np.cos(x[7])
+
+
+@njit(cache=True)
+def integrate(x0, c, ai, af, controls, steps, method):
+    """
+    Integration loop
+
+    x0: initial state (9,)
+    c: coefficients from pack
+    ai, af: aero tables from pack_aero
+    controls: controls of each step at the start, middle and end of the
+    step, shape (n,3,5)
+    steps: length of each step, shape (n,)
+    method: METHODS value
+
+    Output: states after each step, shape (n,9)
+    """
+    n = steps.shape[0]
+    states = np.empty((n, 9))
+    x = x0.copy()
+    k1 = np.empty(9)
+    k2 = np.empty(9)
+    k3 = np.empty(9)
+    k4 = np.empty(9)
+    tmp = np.empty(9)
+    work = np.empty(WORK_SIZE)
+    for i in range(n):
+        h = steps[i]
+        if method == 0: # euler
+            _xdot(x, controls[i, 0], c, ai, af, work, k1)
+            for j in range(9):
+                x[j] = x[j] + k1[j]*h
+        elif method == 1: # semi_implicit
+            _xdot(x, controls[i, 0], c, ai, af, work, k1)
+            for j in range(6):
+                x[j] += k1[j]*h
+            _euler_rates(x, k2)
+            for j in range(6, 9):
+                x[j] += k2[j]*h
+        else: # rk4
+            _xdot(x, controls[i, 0], c, ai, af, work, k1)
+            for j in range(9):
+                tmp[j] = x[j] + h/2*k1[j]
+            _xdot(tmp, controls[i, 1], c, ai, af, work, k2)
+            for j in range(9):
+                tmp[j] = x[j] + h/2*k2[j]
+            _xdot(tmp, controls[i, 1], c, ai, af, work, k3)
+            for j in range(9):
+                tmp[j] = x[j] + h*k3[j]
+            _xdot(tmp, controls[i, 2], c, ai, af, work, k4)
+            for j in range(9):
+                x[j] = x[j] + h/6*(k1[j] + 2*k2[j] + 2*k3[j] + k4[j])
+        states[i] = x
+    return states
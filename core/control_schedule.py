@@ -0,0 +1,172 @@
+import numpy as np
+
+CONTROLS = {"aileron": 0, "elevator": 1, "rudder": 2, "throttle1": 3, "throttle2": 4}
+
+
+def _channel(control):
+    """
+    Index of a control, by name (CONTROLS) or by index 0..4
+    """
+    if isinstance(control, str):
+        if control not in CONTROLS:
+            raise ValueError(f'{control} NOT IS A CONTROL, use one of {list(CONTROLS)}')
+        return CONTROLS[control]
+    if not 0 <= int(control) <= 4:
+        raise ValueError(f'{control} NOT IS A CONTROL, index 0..4')
+    return int(control)
+
+
+class Step:
+    """
+    Piecewise constant input, start <= t <= end (end None: until the end)
+
+    mode "add": value is added to the control, "set": the control takes value
+    """
+    def __init__(self, control, start, value, end=None, mode="add"):
+        if mode not in ("add", "set"):
+            raise ValueError(f'{mode} NOT IS SUPPORTED, use add or set')
+        self.channel = _channel(control)
+        self.start = start
+        self.end = np.inf if end is None else end
+        self.value = value
+        self.mode = mode
+
+    def apply(self, t, U):
+        active = (self.start <= t) & (t <= self.end)
+        if self.mode == "add":
+            U[..., self.channel] += np.where(active, self.value, 0.0)
+        else:
+            U[..., self.channel] = np.where(active, self.value, U[..., self.channel])
+
+
+class Ramp:
+    """
+    Linear input, the control changes by value between start and end, then
+    keeps the change (hold True) or goes back (hold False)
+    """
+    def __init__(self, control, start, end, value, hold=True):
+        if end <= start:
+            raise ValueError(f'Ramp end ({end}) has to be after start ({start})')
+        self.channel = _channel(control)
+        self.start = start
+        self.end = end
+        self.value = value
+        self.hold = hold
+
+    def apply(self, t, U):
+        fraction = np.clip((t - self.start)/(self.end - self.start), 0.0, 1.0)
+        if not self.hold:
+            fraction = np.where(t > self.end, 0.0, fraction)
+        U[..., self.channel] += self.value*fraction
+
+
+class EngineOut:
+    """
+    Shut off engines (1 and/or 2) from time on
+    """
+    def __init__(self, engines, time):
+        engines = [engines] if np.isscalar(engines) else list(engines)
+        for engine in engines:
+            if engine not in (1, 2):
+                raise ValueError(f'engine {engine} NOT EXIST, use 1 or 2')
+        self.channels = [2 + engine for engine in engines]
+        self.time = time
+
+    def apply(self, t, U):
+        failed = t >= self.time
+        for channel in self.channels:
+            U[..., channel] = np.where(failed, 0.0, U[..., channel])
+
+
+EVENTS = {"step": Step, "ramp": Ramp, "engine_out": EngineOut}
+
+
+def event_from_dict(data):
+    """
+    Event from its config, e.g.
+        {"type":"step","control":"elevator","start":10,"end":12,"value":-0.02}
+        {"type":"ramp","control":"throttle1","start":5,"end":15,"value":0.02}
+        {"type":"engine_out","engines":[1,2],"time":50}
+    """
+    data = dict(data)
+    kind = data.pop("type", None)
+    if kind not in EVENTS:
+        raise ValueError(f'event type {kind} NOT IS SUPPORTED, use one of {list(EVENTS)}')
+    return EVENTS[kind](**data)
+
+
+class ControlSchedule:
+    """
+    Controls as a function of time: initial U plus a list of events applied
+    in order (Step, Ramp, EngineOut).
+
+    compile(time_grid) evaluates the schedule once at every time the fixed
+    step integrators use, the simulation loop only indexes that table.
+    """
+    def __init__(self, U, events=()):
+        self.U = np.asarray(U, dtype=float)
+        self.events = [event_from_dict(e) if isinstance(e, dict) else e for e in events]
+
+    @classmethod
+    def from_config(cls, sim_params):
+        """
+        Schedule of SimulationParameters: the aleron pulse (da, da_start,
+        da_end) and engine failure (eg, eg_time) fields, then the events list
+        """
+        events = []
+        if sim_params.da != 0.0:
+            events.append(Step("aileron", sim_params.da_start, sim_params.da, end=sim_params.da_end))
+        if sim_params.eg_time != 0 and sim_params.eg in (1, 2, 3):
+            engines = {1: [1], 2: [2], 3: [1, 2]}[sim_params.eg]
+            events.append(EngineOut(engines, sim_params.eg_time))
+        events += list(getattr(sim_params, "events", None) or [])
+        return cls(sim_params.U, events)
+
+    def controls(self, t):
+        """
+        Controls at the times t, shape t.shape + (5,)
+        """
+        t = np.asarray(t, dtype=float)
+        U = np.empty(t.shape + (5,))
+        U[...] = self.U
+        for event in self.events:
+            event.apply(t, U)
+        return U
+
+    def compile(self, time_grid):
+        return CompiledSchedule(self, time_grid)
+
+
+class CompiledSchedule:
+    """
+    Controls tabulated at the start and the middle of every step and at the
+    last time: table[2k] at time_grid[k], table[2k+1] at the middle of step k.
+    """
+    def __init__(self, schedule, time_grid):
+        time_grid = np.asarray(time_grid, dtype=float)
+        self.schedule = schedule
+        self.t0 = time_grid[0]
+        self.n_steps = len(time_grid) - 1
+        self.dt = (time_grid[-1] - time_grid[0])/self.n_steps if self.n_steps else 1.0
+        times = np.empty(2*self.n_steps + 1)
+        times[0::2] = time_grid
+        times[1::2] = time_grid[:-1] + np.diff(time_grid)/2
+        self.table = schedule.controls(times)
+        self.table.flags.writeable = False
+
+    def stages(self):
+        """
+        Controls at start, middle and end of each step, shape (n_steps,3,5)
+        """
+        return np.stack((self.table[0:-1:2], self.table[1::2], self.table[2::2]), axis=1)
+
+    def __call__(self, t):
+        """
+        Controls at time t, from the table when t is a tabulated time (all
+        the fixed step integrators), evaluated otherwise (rk45)
+        """
+        position = 2*(t - self.t0)/self.dt
+        j = int(round(position))
+        if abs(position - j) < 1e-6 and 0 <= j < len(self.table):
+            return self.table[j]
+        return self.schedule.controls(t)
@@ -0,0 +1,94 @@
+import json
+import time
+import numpy as np
+
+
+class RunStats:
+    """
+    Counters of a simulation run, filled by Simulate when it is given one:
+
+        stats = RunStats()
+        Simulate(ac_params, sim_params, stats=stats).simulate()
+        print(stats.summary())
+
+    Without stats Simulate does not time anything, the loop is the same as
+    before. Optional callbacks:
+        on_step(k, t, x): after every step
+        on_fail(k, t, x): first step where the divergence warning trips
+        (Va > 300 or any Euler angle > pi/2)
+    """
+    def __init__(self, on_step=None, on_fail=None):
+        self.on_step = on_step
+        self.on_fail = on_fail
+        self.reset()
+
+    def reset(self):
+        self.integrator = None
+        self.backend = None
+        self.steps = 0
+        self.nfev = 0
+        self.wall_time = 0.0
+        self.xdot_time = 0.0 # with the numba backend, time inside the kernels
+        self.first_fail_step = None
+        self.first_fail_time = None
+        self.first_fail_state = None
+        self._start = None
+
+    def start(self, integrator, backend):
+        self.reset()
+        self.integrator = integrator
+        self.backend = backend
+        self._start = time.perf_counter()
+
+    def stop(self, steps, nfev):
+        self.wall_time = time.perf_counter() - self._start
+        self.steps = steps
+        self.nfev = nfev
+
+    def timed(self, function):
+        """
+        Wrap the derivative function to add its time to xdot_time
+        """
+        def wrapper(t, x):
+            start = time.perf_counter()
+            x_dot = function(t, x)
+            self.xdot_time += time.perf_counter() - start
+            return x_dot
+        return wrapper
+
+    def step(self, k, t, x):
+        if self.on_step is not None:
+            self.on_step(k, t, x)
+
+    def fail(self, k, t, x):
+        """
+        Save the first step where the simulation diverge
+        """
+        if self.first_fail_step is None:
+            self.first_fail_step = int(k)
+            self.first_fail_time = float(t)
+            self.first_fail_state = np.array(x, dtype=float)
+            if self.on_fail is not None:
+                self.on_fail(k, t, x)
+
+    def summary(self):
+        """
+        Structured summary of the run, plain python values
+        """
+        return {
+            "integrator": self.integrator,
+            "backend": self.backend,
+            "steps": self.steps,
+            "nfev": self.nfev,
+            "wall_time_s": self.wall_time,
+            "xdot_time_s": self.xdot_time,
+            "bookkeeping_time_s": max(self.wall_time - self.xdot_time, 0.0),
+            "steps_per_s": self.steps/self.wall_time if self.wall_time > 0 else None,
+            "first_fail_step": self.first_fail_step,
+            "first_fail_time": self.first_fail_time,
+            "first_fail_state": None if self.first_fail_state is None else self.first_fail_state.tolist(),
+        }
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
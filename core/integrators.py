@@ -0,0 +1,256 @@
+import numpy as np
+
+
+class Euler:
+    """
+    Explicit Euler, one evaluation per step.
+    """
+    name = "euler"
+
+    def step(self, f, t, x, dt):
+        return x + f(t, x)*dt
+
+    def integrate(self, f, x0, time_grid):
+        """
+        Advance x0 over time_grid, yield the state at time_grid[1], time_grid[2], ...
+
+        f: derivative function, f(t,x) -> x_dot
+        """
+        x = x0
+        for k in range(1, len(time_grid)):
+            x = self.step(f, time_grid[k-1], x, time_grid[k]-time_grid[k-1])
+            yield x
+
+
+class RK4(Euler):
+    """
+    Classic fixed step Runge-Kutta of 4th order, four evaluations per step.
+    """
+    name = "rk4"
+
+    def step(self, f, t, x, dt):
+        k1 = f(t, x)
+        k2 = f(t + dt/2, x + dt/2*k1)
+        k3 = f(t + dt/2, x + dt/2*k2)
+        k4 = f(t + dt, x + dt*k3)
+        return x + dt/6*(k1 + 2*k2 + 2*k3 + k4)
+
+
+class SemiImplicitEuler(Euler):
+    """
+    Semi-implicit (symplectic) Euler, one evaluation per step.
+
+    The dynamic states x[...,:split] (body speeds and angle rates) are advanced
+    with explicit Euler, then the kinematic states x[...,split:] (Euler angles)
+    are advanced with the derivative evaluated at the new rates.
+
+    kinematics: function, kinematics(x) -> derivative of x[...,split:]
+    """
+    name = "semi_implicit"
+
+    def __init__(self, kinematics, split=6):
+        self.kinematics = kinematics
+        self.split = split
+
+    def step(self, f, t, x, dt):
+        x_dot = f(t, x)
+        x_next = np.array(x, dtype=float)
+        x_next[...,:self.split] += x_dot[...,:self.split]*dt
+        x_next[...,self.split:] += self.kinematics(x_next)*dt
+        return x_next
+
+
+class DormandPrince45:
+    """
+    Adaptive Dormand-Prince RK5(4) with error control.
+
+    The internal step is chosen by the error estimate (rtol, atol), so it can be
+    much larger than the output interval. The states on time_grid are obtained
+    with the 4th order dense output of the method, they do not cost evaluations.
+
+    A diverging run makes the step tiny instead of failing, so the step has a
+    floor (min_step, by default 1e-6 times the output interval) and the
+    trial steps a budget (max_steps, by default 100 per output interval),
+    FloatingPointError is raised when one of them is hit.
+
+    A batch of independent samples (rows of x, e.g. Monte Carlo) is given a
+    freeze function, see integrate. The error is then the max of the norm
+    of each row, so one sample is not diluted by the others, and a sample
+    that diverges is stopped instead of shrinking the step of the batch.
+    """
+    name = "rk45"
+
+    C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+    A = [
+        np.array([]),
+        np.array([1/5]),
+        np.array([3/40, 9/40]),
+        np.array([44/45, -56/15, 32/9]),
+        np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+        np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+    ]
+    B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+    # Difference between 5th and 4th order solutions, 7 stages (FSAL)
+    E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40])
+    # Dense output, y(t+theta*h) = y + h*K.T@P@[theta,theta**2,theta**3,theta**4]
+    P = np.array([
+        [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+        [0, 0, 0, 0],
+        [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+        [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+        [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+        [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+        [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+    ])
+
+    def __init__(self, rtol=1e-6, atol=1e-8, max_step=np.inf, first_step=None,
+                 min_step=None, max_steps=None):
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.first_step = first_step
+        self.min_step = min_step
+        self.max_steps = max_steps
+
+    def _step(self, f, t, x, f0, h):
+        """
+        One trial step, return x_new, f_new, stages and the scaled error
+        error/(atol + rtol*|x|), the step is accepted if its norm is <= 1
+        """
+        K = np.empty((7,) + np.shape(x))
+        K[0] = f0
+        for i in range(1, 6):
+            dx = np.tensordot(self.A[i], K[:i], axes=1)*h
+            K[i] = f(t + self.C[i]*h, x + dx)
+        x_new = x + h*np.tensordot(self.B, K[:6], axes=1)
+        f_new = f(t + h, x_new)
+        K[6] = f_new
+        error = h*np.tensordot(self.E, K, axes=1)
+        scale = self.atol + self.rtol*np.maximum(np.abs(x), np.abs(x_new))
+        return x_new, f_new, K, error/scale
+
+    def _stop(self, rows, f0):
+        """
+        Freeze the samples of rows at their last accepted state
+        """
+        self.frozen |= rows
+        f0[rows] = 0
+
+    def integrate(self, f, x0, time_grid, freeze=None):
+        """
+        Advance x0 over time_grid, yield the state at time_grid[1], time_grid[2], ...
+
+        f: derivative function, f(t,x) -> x_dot
+        freeze: for a batch x0 of shape (N,n), function freeze(x) -> (N,)
+        mask of the samples that diverged. They keep their last state, like
+        the samples that are not finite in a trial step or need a step under
+        the minimum. self.frozen has the mask of the stopped samples.
+        """
+        t = time_grid[0]
+        t_end = time_grid[-1]
+        x = np.asarray(x0, dtype=float)
+        batch = freeze is not None
+        self.frozen = None
+        if batch:
+            self.frozen = np.zeros(len(x), dtype=bool)
+            f_batch = f
+
+            def f(t, x):
+                x_dot = f_batch(t, x)
+                x_dot[self.frozen] = 0
+                return x_dot
+        f0 = f(t, x)
+        if batch:
+            self._stop(freeze(x), f0)
+        if len(time_grid) > 1:
+            h = self.first_step or (time_grid[1] - time_grid[0])
+        else:
+            h = 0.0
+        h = min(h, self.max_step)
+        n_out = len(time_grid) - 1
+        min_step = self.min_step
+        if min_step is None:
+            min_step = 1e-6*(t_end - t)/n_out if n_out else 0.0
+        min_step = max(min_step, 10*np.finfo(float).eps*max(abs(t_end), 1.0))
+        max_steps = 100*n_out if self.max_steps is None else self.max_steps
+        n_trials = 0
+        k = 1
+        while k < len(time_grid):
+            h = min(h, t_end - t)
+            n_trials += 1
+            if n_trials > max_steps:
+                raise FloatingPointError(
+                    f'rk45 used the {max_steps} steps of the budget at t = {t} (step {h:.3g})'
+                )
+            x_new, f_new, K, error = self._step(f, t, x, f0, h)
+            if batch:
+                # Norm of each sample, the worst one sets the step
+                with np.errstate(invalid="ignore", over="ignore"):
+                    row_norm = np.sqrt(np.mean(error**2, axis=-1))
+                row_norm[self.frozen] = 0
+                blown = ~np.isfinite(row_norm)
+                if np.any(blown):
+                    self._stop(blown, f0)
+                    continue
+                error_norm = row_norm.max()
+            else:
+                error_norm = np.sqrt(np.mean(error**2))
+            if not np.isfinite(error_norm) or error_norm > 1:
+                h_trial = h
+                # Rejected, shrink the step and try again (a NaN or inf
+                # solution is rejected too, never accepted or used to grow h)
+                if np.isfinite(error_norm):
+                    h *= max(0.2, 0.9*error_norm**(-1/5))
+                else:
+                    h *= 0.2
+                # The last step before t_end can be short, only a shrunk step counts
+                if h < min_step and batch:
+                    # The samples that need the tiny step diverge, stop them
+                    self._stop(row_norm > 1, f0)
+                    h = h_trial
+                elif h < min_step:
+                    raise FloatingPointError(
+                        f'rk45 step size under the minimum {min_step:.3g} at t = {t}, error norm {error_norm}'
+                    )
+                continue
+            t_new = t + h
+            # Grid points inside the accepted step, from the dense output
+            Q = np.tensordot(K, self.P, axes=([0], [0])) # shape x.shape + (4,)
+            while k < len(time_grid) and time_grid[k] <= t_new + 1e-12*abs(t_new):
+                theta = (time_grid[k] - t)/h
+                powers = theta**np.arange(1, 5)
+                yield x + h*(Q@powers)
+                k += 1
+            t, x, f0 = t_new, x_new, f_new
+            if batch:
+                self._stop(freeze(x) & ~self.frozen, f0)
+            if error_norm == 0:
+                factor = 10
+            else:
+                factor = min(10, 0.9*error_norm**(-1/5))
+            h = min(h*factor, self.max_step)
+
+
+INTEGRATORS = {
+    "euler": Euler,
+    "rk4": RK4,
+    "semi_implicit": SemiImplicitEuler,
+    "rk45": DormandPrince45,
+}
+
+
+def make_integrator(name, kinematics=None, rtol=1e-6, atol=1e-8):
+    """
+    Build the integrator selected in the simulation config
+
+    name: "euler", "rk4", "semi_implicit" or "rk45"
+    kinematics: derivative of the Euler angles, only used by "semi_implicit"
+    rtol, atol: tolerances, only used by "rk45"
+    """
+    if name not in INTEGRATORS:
+        raise ValueError(f'{name} NOT IS SUPPORTED, use one of {list(INTEGRATORS)}')
+    if name == "semi_implicit":
+        return SemiImplicitEuler(kinematics)
+    if name == "rk45":
+        return DormandPrince45(rtol=rtol, atol=atol)
+    return INTEGRATORS[name]()
@@ -0,0 +1,152 @@
+import numpy as np
+from core.aircraft_model import AircraftModel, ModelCoefficients
+from domain.linear_model import LinearModel
+
+# Longitudinal [u,w,q,theta] and lateral [v,p,r,phi] states
+LONGITUDINAL = [0, 2, 4, 7]
+LATERAL = [1, 3, 5, 6]
+
+
+class Linearization:
+    """
+    Linearize AircraftModel.xdot around an operating point (usually a trim
+    point) and find the dynamic modes.
+
+    The Jacobians are central differences of the 9 states and 5 controls.
+    The 1 + 2*14 evaluations go in one AircraftModel.xdot_batch call, and
+    linearize_many puts the evaluations of all the aircrafts in one call too.
+    """
+    N_X = 9
+    N_U = 5
+
+    @staticmethod
+    def _perturbations(X, U, eps):
+        """
+        States and controls of the central differences, shape (29,9) and (29,5)
+
+        row 0: operating point
+        rows 1..14: + step in each of the 14 variables
+        rows 15..28: - step in each of the 14 variables
+        """
+        z0 = np.concatenate((X, U))
+        steps = eps*np.maximum(np.abs(z0), 1)
+        delta = np.diag(steps)
+        Z = np.vstack((z0, z0 + delta, z0 - delta))
+        return Z[:, :9], Z[:, 9:], steps
+
+    @staticmethod
+    def _jacobians(F, steps):
+        """
+        A,B from the derivatives of the perturbed rows
+        """
+        n = len(steps)
+        J = ((F[1:n+1] - F[n+1:])/(2*steps[:, None])).T
+        return J[:, :9], J[:, 9:]
+
+    @staticmethod
+    def _mode(eigenvalue):
+        if eigenvalue is None:
+            return None
+        wn = abs(eigenvalue)
+        return {
+            "eigenvalue": complex(eigenvalue),
+            "wn": float(wn),
+            "zeta": float(-eigenvalue.real/wn) if wn > 0 else 1.0,
+            "period": float(2*np.pi/abs(eigenvalue.imag)) if eigenvalue.imag != 0 else np.inf,
+        }
+
+    @staticmethod
+    def modes(A):
+        """
+        Classic aircraft modes from the longitudinal and lateral blocks of A
+
+        Longitudinal: the oscillatory pair with higher natural frequency is the
+        short period, the lower one the phugoid.
+        Lateral: the oscillatory pair is the Dutch roll, the fastest real root
+        the roll subsidence and the slowest the spiral.
+        """
+        def split(eigs):
+            pairs = sorted((e for e in eigs if e.imag > 1e-9), key=abs)
+            real = sorted((e.real for e in eigs if abs(e.imag) <= 1e-9), key=abs)
+            return pairs, real
+
+        long_pairs, _ = split(np.linalg.eigvals(A[np.ix_(LONGITUDINAL, LONGITUDINAL)]))
+        lat_pairs, lat_real = split(np.linalg.eigvals(A[np.ix_(LATERAL, LATERAL)]))
+        short_period = long_pairs[-1] if len(long_pairs) == 2 else None
+        phugoid = long_pairs[0] if long_pairs else None
+        return {
+            "short_period": Linearization._mode(short_period),
+            "phugoid": Linearization._mode(phugoid),
+            "dutch_roll": Linearization._mode(lat_pairs[-1] if lat_pairs else None),
+            "roll": Linearization._mode(complex(lat_real[-1]) if lat_real else None),
+            "spiral": Linearization._mode(complex(lat_real[0]) if len(lat_real) > 1 else None),
+        }
+
+    @staticmethod
+    def _linear_model(A, B, X, U):
+        return LinearModel(
+            A=A,
+            B=B,
+            X=np.array(X, dtype=float),
+            U=np.array(U, dtype=float),
+            eigenvalues=np.linalg.eigvals(A),
+            modes=Linearization.modes(A),
+        )
+
+    @staticmethod
+    def linearize(model, X, U, eps=1e-6, altitude=0.0):
+        """
+        Linear model of an AircraftModel at the state X and controls U
+        (e.g. point.X, point.U of Trim.solve)
+
+        altitude: m, altitude of the operating point (point.altitude), the
+        density of the model atmosphere is taken there
+
+        Output: LinearModel
+        """
+        states, controls, steps = Linearization._perturbations(
+            np.asarray(X, dtype=float), np.asarray(U, dtype=float), eps
+        )
+        F = model.xdot_batch(states, controls, altitude=altitude)
+        A, B = Linearization._jacobians(F, steps)
+        return Linearization._linear_model(A, B, X, U)
+
+    @staticmethod
+    def linearize_many(ac_params_list, points, eps=1e-6, altitude=None, atmosphere=None):
+        """
+        Linear models of several aircrafts, each one at its own operating point,
+        with a single batched evaluation of the model.
+
+        ac_params_list: list of AircraftParameters
+        points: list of operating points with .X and .U (TrimPoint), same order
+        altitude: m, scalar or one per point. None: point.altitude of each
+        point (0 if the point has no altitude)
+        atmosphere: Atmosphere of the model (core/atmosphere.py), None: sea
+        level air, use the one of the Trim that solved the points
+
+        Output: list of LinearModel
+        """
+        rows = [
+            Linearization._perturbations(
+                np.asarray(p.X, dtype=float), np.asarray(p.U, dtype=float), eps
+            )
+            for p in points
+        ]
+        n_rows = len(rows[0][0])
+        states = np.vstack([r[0] for r in rows])
+        controls = np.vstack([r[1] for r in rows])
+        stacked = ModelCoefficients.stack(ac_params_list)
+        coefficients = stacked.take(np.repeat(np.arange(len(points)), n_rows))
+        if altitude is None:
+            altitude = [getattr(p, "altitude", 0.0) for p in points]
+        altitude = np.broadcast_to(np.asarray(altitude, dtype=float), (len(points),))
+        model = AircraftModel(ac_params_list[0], atmosphere=atmosphere)
+        F = model.xdot_batch(
+            states, controls, coefficients=coefficients,
+            altitude=np.repeat(altitude, n_rows),
+        )
+        models = []
+        for i, point in enumerate(points):
+            A, B = Linearization._jacobians(F[i*n_rows:(i+1)*n_rows], rows[i][2])
+            models.append(Linearization._linear_model(A, B, point.X, point.U))
+        return models
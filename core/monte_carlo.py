@@ -0,0 +1,150 @@
+import dataclasses
+import numpy as np
+from core.aero_database import aero_from_dict
+from core.aircraft_model import AircraftModel, ModelCoefficients
+from core.integrators import make_integrator
+from core.simulation import Simulate, STATE_COLUMNS
+from domain.monte_carlo_result import MonteCarloResult
+
+
+class MonteCarlo:
+    """
+    Monte Carlo dispersion of the aircraft parameters and the initial state.
+
+    All the samples are propagated together as one (N,9) array with
+    AircraftModel.xdot_batch, and only the percentile envelopes of each step
+    are kept, so the memory does not grow with the number of samples.
+    """
+    DISPERSABLE = ["m","inertia_matrix","alpha_0","n","s_t","l_t"]
+
+    def __init__(self,ac_params,sim_params,dispersions,x_sigma=None,
+                 n_samples=1000,percentiles=(1,5,50,95,99),seed=None):
+        """
+        Input:
+            ac_params: nominal AircraftParameters
+            sim_params: SimulationParameters, the controls (da, eg) and the
+            integrator are the same for all the samples
+            dispersions: standard deviation of a normal dispersion around the
+            nominal value, in the units of the field. With aero tables the
+            fields of AeroDatabase.unused_parameters are rejected
+                dispersions = {"m": 5e3, "alpha_0": 0.01, "inertia_matrix": 0.5}
+            inertia_matrix takes a scalar or a 3x3 matrix of sigmas, the
+            sampled matrices are kept symmetric
+            x_sigma: standard deviation of the initial state X, 9 values
+            n_samples: number of trajectories
+            percentiles: percentiles saved at each step
+            seed: seed of the random generator
+        """
+        aero = aero_from_dict(getattr(ac_params,"aero",None))
+        unused = [] if aero is None else aero.unused_parameters()
+        for key in dispersions:
+            if key not in self.DISPERSABLE:
+                raise ValueError(f'{key} NOT IS SUPPORTED, use one of {self.DISPERSABLE}')
+            if key in unused:
+                raise ValueError(f'{key} has no effect with the aero tables of the aircraft, {unused} are not used')
+        self.ac_params = ac_params
+        self.pars = sim_params
+        self.dispersions = dispersions
+        self.x_sigma = np.zeros(9) if x_sigma is None else np.asarray(x_sigma,dtype=float)
+        self.n_samples = n_samples
+        self.percentiles = np.asarray(percentiles,dtype=float)
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self,X=None):
+        """
+        Draw the samples around the nominal initial state X (by default
+        the X of the simulation parameters)
+
+        Output:
+            ac_samples: list of N AircraftParameters
+            X0: initial states, shape (N,9)
+        """
+        N = self.n_samples
+        draws = {}
+        for key,sigma in self.dispersions.items():
+            nominal = np.asarray(getattr(self.ac_params,key),dtype=float)
+            noise = self.rng.normal(size=(N,)+nominal.shape)*np.asarray(sigma,dtype=float)
+            if key == "inertia_matrix":
+                noise = (noise + np.swapaxes(noise,-1,-2))/2
+            draws[key] = nominal + noise
+        ac_samples = []
+        for i in range(N):
+            values = {}
+            for key,value in draws.items():
+                values[key] = value[i] if key == "inertia_matrix" else float(value[i])
+            ac_samples.append(dataclasses.replace(self.ac_params,**values))
+        X = self.pars.X if X is None else X
+        X0 = np.asarray(X,dtype=float) + self.rng.normal(size=(N,9))*self.x_sigma
+        return ac_samples, X0
+
+    def run(self):
+        """
+        Propagate the samples and return a MonteCarloResult
+        """
+        sim = Simulate(self.ac_params,self.pars)
+        model = sim.model
+        time_grid = sim.time_grid()
+        ac_samples, X0 = self.sample(sim.pars.X) # trimmed X if the config has "trim"
+        if sim.tracks_position:
+            # The density depends on the altitude, integrate the position too
+            position0 = np.asarray(getattr(self.pars,"position0",np.zeros(3)),dtype=float)
+            X0 = np.hstack((X0,np.tile(position0,(len(X0),1))))
+        coefficients = ModelCoefficients.stack(ac_samples)
+        integrator = make_integrator(
+            self.pars.integrator,
+            kinematics=AircraftModel.kinematics,
+            rtol=self.pars.rtol,
+            atol=self.pars.atol,
+        )
+
+        controls = sim.control_schedule(time_grid)
+
+        def rhs(t,x):
+            return model.xdot_batch(x,controls(t),coefficients=coefficients,t=t)
+
+        n_steps = len(time_grid)
+        envelopes = np.empty((n_steps,len(self.percentiles),9))
+        mean = np.empty((n_steps,9))
+        failed = np.zeros(self.n_samples,dtype=bool)
+
+        def diverged(x):
+            x = x[:,:9]
+            # Divergence warning, same conditions as Simulate
+            Va = np.sqrt(x[:,0]**2 + x[:,1]**2 + x[:,2]**2)
+            # NaN compares False, the samples that are not finite fail too
+            return (Va > 300) | np.any(np.abs(x[:,6:9]) > np.pi/2,axis=1) | ~np.all(np.isfinite(x),axis=1)
+
+        def reduce(k,x):
+            x = x[:,:9]
+            finite = np.all(np.isfinite(x),axis=1)
+            failed[:] |= diverged(x)
+            if np.all(finite):
+                envelopes[k] = np.percentile(x,self.percentiles,axis=0)
+                mean[k] = x.mean(axis=0)
+            else:
+                # Envelopes of the finite samples, the others are in n_failed
+                envelopes[k] = np.nanpercentile(np.where(np.isfinite(x),x,np.nan),self.percentiles,axis=0)
+                mean[k] = np.nanmean(np.where(np.isfinite(x),x,np.nan),axis=0)
+
+        if integrator.name == "rk45":
+            # One step for the batch, a diverging sample is stopped instead
+            # of shrinking the step of all the others
+            steps = integrator.integrate(rhs,X0.copy(),time_grid,freeze=diverged)
+        else:
+            steps = integrator.integrate(rhs,X0.copy(),time_grid)
+        reduce(0,X0)
+        for k,x in enumerate(steps,start=1):
+            reduce(k,x)
+        if integrator.name == "rk45":
+            # Samples stopped by the integrator, also before reaching the limits
+            failed |= integrator.frozen
+
+        return MonteCarloResult(
+            time=time_grid,
+            percentiles=self.percentiles,
+            envelopes=envelopes,
+            mean=mean,
+            n_samples=self.n_samples,
+            n_failed=int(failed.sum()),
+            columns=list(STATE_COLUMNS),
+        )
@@ -5,48 +5,176 @@ class Operations:
 
     def __init__(self):
         pass
-    
+
     @staticmethod
     def body_rotation_matrix(phi, theta, psi):
         """
         Calculate the body rotation matrix from Euler angles.
         """
-        R_roll = np.array([
-            [1, 0, 0],
-            [0, np.cos(phi), -np.sin(phi)],
-            [0, np.sin(phi), np.cos(phi)]
-        ])
-
-        R_pitch = np.array([
-            [np.cos(theta), 0, np.sin(theta)],
-            [0, 1, 0],
-            [-np.sin(theta), 0, np.cos(theta)]
-        ])
-
-        R_yaw = np.array([
-            [np.cos(psi), -np.sin(psi), 0],
-            [np.sin(psi), np.cos(psi), 0],
-            [0, 0, 1]
-        ])
-
-        R = R_yaw @ R_pitch @ R_roll
-        return R
+        return Operations.body_rotation_matrices(phi, theta, psi)
+
     @staticmethod
     def wind_rotation_matrix(alpha, beta):
         """
         Calculate the wind rotation matrix from angles of attack and sideslip.
         """
-        R_alpha = np.array([
-            [np.cos(alpha), 0, -np.sin(alpha)],
-            [0, 1, 0],
-            [np.sin(alpha), 0, np.cos(alpha)]
-        ])
+        return Operations.wind_rotation_matrices(alpha, beta)
+
+    @staticmethod
+    def body_rotation_matrices(phi, theta, psi):
+        """
+        Body rotation matrices R = R_yaw @ R_pitch @ R_roll for arrays of
+        Euler angles (body to earth axes).
+
+        Input: phi, theta, psi, scalars or arrays of the same shape (N,)
+        Output: shape (N,3,3), or (3,3) for scalars
+        """
+        phi, theta, psi = np.broadcast_arrays(
+            np.asarray(phi, dtype=float), np.asarray(theta, dtype=float), np.asarray(psi, dtype=float)
+        )
+        c_phi, s_phi = np.cos(phi), np.sin(phi)
+        c_th, s_th = np.cos(theta), np.sin(theta)
+        c_psi, s_psi = np.cos(psi), np.sin(psi)
+        R = np.empty(phi.shape + (3, 3))
+        R[..., 0, 0] = c_psi*c_th
+        R[..., 0, 1] = c_psi*s_th*s_phi - s_psi*c_phi
+        R[..., 0, 2] = c_psi*s_th*c_phi + s_psi*s_phi
+        R[..., 1, 0] = s_psi*c_th
+        R[..., 1, 1] = s_psi*s_th*s_phi + c_psi*c_phi
+        R[..., 1, 2] = s_psi*s_th*c_phi - c_psi*s_phi
+        R[..., 2, 0] = -s_th
+        R[..., 2, 1] = c_th*s_phi
+        R[..., 2, 2] = c_th*c_phi
+        return R
+
+    @staticmethod
+    def wind_rotation_matrices(alpha, beta):
+        """
+        Wind rotation matrices R = R_beta @ R_alpha for arrays of angles of
+        attack and sideslip.
+
+        Output: shape (N,3,3), or (3,3) for scalars
+        """
+        alpha, beta = np.broadcast_arrays(np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float))
+        c_a, s_a = np.cos(alpha), np.sin(alpha)
+        c_b, s_b = np.cos(beta), np.sin(beta)
+        R = np.empty(alpha.shape + (3, 3))
+        R[..., 0, 0] = c_b*c_a
+        R[..., 0, 1] = -s_b
+        R[..., 0, 2] = -c_b*s_a
+        R[..., 1, 0] = s_b*c_a
+        R[..., 1, 1] = c_b
+        R[..., 1, 2] = -s_b*s_a
+        R[..., 2, 0] = s_a
+        R[..., 2, 1] = 0
+        R[..., 2, 2] = c_a
+        return R
+
+    @staticmethod
+    def stability_to_body_matrices(alpha):
+        """
+        Rotation from stability to body axes (c_bs of AircraftModel),
+        the R_alpha part of the wind rotation.
+
+        Output: shape (N,3,3), or (3,3) for a scalar
+        """
+        alpha = np.asarray(alpha, dtype=float)
+        c_a, s_a = np.cos(alpha), np.sin(alpha)
+        R = np.zeros(alpha.shape + (3, 3))
+        R[..., 0, 0] = c_a
+        R[..., 0, 2] = -s_a
+        R[..., 1, 1] = 1
+        R[..., 2, 0] = s_a
+        R[..., 2, 2] = c_a
+        return R
+
+    @staticmethod
+    def euler_rates_matrices(phi, theta):
+        """
+        Matrices E with [phi_dot,theta_dot,psi_dot] = E @ [p,q,r]
+
+        Output: shape (N,3,3), or (3,3) for scalars
+        """
+        phi, theta = np.broadcast_arrays(np.asarray(phi, dtype=float), np.asarray(theta, dtype=float))
+        c_phi, s_phi = np.cos(phi), np.sin(phi)
+        t_th, c_th = np.tan(theta), np.cos(theta)
+        E = np.zeros(phi.shape + (3, 3))
+        E[..., 0, 0] = 1
+        E[..., 0, 1] = s_phi*t_th
+        E[..., 0, 2] = c_phi*t_th
+        E[..., 1, 1] = c_phi
+        E[..., 1, 2] = -s_phi
+        E[..., 2, 1] = s_phi/c_th
+        E[..., 2, 2] = c_phi/c_th
+        return E
+
+    @staticmethod
+    def euler_to_quaternion(phi, theta, psi):
+        """
+        Quaternions [q0,q1,q2,q3] (scalar first) of the body rotation
+        R_yaw @ R_pitch @ R_roll
+
+        Output: shape (N,4), or (4,) for scalars
+        """
+        phi, theta, psi = np.broadcast_arrays(
+            np.asarray(phi, dtype=float), np.asarray(theta, dtype=float), np.asarray(psi, dtype=float)
+        )
+        c_phi, s_phi = np.cos(phi/2), np.sin(phi/2)
+        c_th, s_th = np.cos(theta/2), np.sin(theta/2)
+        c_psi, s_psi = np.cos(psi/2), np.sin(psi/2)
+        return np.stack((
+            c_phi*c_th*c_psi + s_phi*s_th*s_psi,
+            s_phi*c_th*c_psi - c_phi*s_th*s_psi,
+            c_phi*s_th*c_psi + s_phi*c_th*s_psi,
+            c_phi*c_th*s_psi - s_phi*s_th*c_psi,
+        ), axis=-1)
+
+    @staticmethod
+    def quaternion_to_euler(q):
+        """
+        Euler angles [phi,theta,psi] of quaternions (scalar first)
+
+        Output: shape (N,3), or (3,) for one quaternion
+        """
+        q = np.asarray(q, dtype=float)
+        q0, q1, q2, q3 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+        phi = np.arctan2(2*(q0*q1 + q2*q3), 1 - 2*(q1**2 + q2**2))
+        theta = np.arcsin(np.clip(2*(q0*q2 - q3*q1), -1, 1))
+        psi = np.arctan2(2*(q0*q3 + q1*q2), 1 - 2*(q2**2 + q3**2))
+        return np.stack((phi, theta, psi), axis=-1)
 
-        R_beta = np.array([
-            [np.cos(-beta), np.sin(-beta), 0],
-            [-np.sin(-beta), np.cos(-beta), 0],
-            [0, 0, 1]
-        ])
+    @staticmethod
+    def quaternion_rotation_matrices(q):
+        """
+        Rotation matrices of quaternions (scalar first), same as
+        body_rotation_matrices of the equivalent Euler angles
 
-        R = R_beta @ R_alpha
+        Output: shape (N,3,3), or (3,3) for one quaternion
+        """
+        q = np.asarray(q, dtype=float)
+        q = q/np.linalg.norm(q, axis=-1, keepdims=True)
+        q0, q1, q2, q3 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+        R = np.empty(q.shape[:-1] + (3, 3))
+        R[..., 0, 0] = 1 - 2*(q2**2 + q3**2)
+        R[..., 0, 1] = 2*(q1*q2 - q0*q3)
+        R[..., 0, 2] = 2*(q1*q3 + q0*q2)
+        R[..., 1, 0] = 2*(q1*q2 + q0*q3)
+        R[..., 1, 1] = 1 - 2*(q1**2 + q3**2)
+        R[..., 1, 2] = 2*(q2*q3 - q0*q1)
+        R[..., 2, 0] = 2*(q1*q3 - q0*q2)
+        R[..., 2, 1] = 2*(q2*q3 + q0*q1)
+        R[..., 2, 2] = 1 - 2*(q1**2 + q2**2)
         return R
+
+    @staticmethod
+    def body_to_inertial(states):
+        """
+        Velocities in earth axes (north, east, down) of the states of a run,
+        one vectorized call for the whole trajectory
+
+        states: shape (N,9) or more columns, [u,v,w,p,q,r,phi,theta,psi,...]
+        Output: shape (N,3)
+        """
+        states = np.asarray(states, dtype=float)
+        R = Operations.body_rotation_matrices(states[..., 6], states[..., 7], states[..., 8])
+        return np.einsum('...ij,...j->...i', R, states[..., 0:3])
@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import time
+import warnings
+import numpy as np
+from domain.pacing_report import PacingReport
+
+# UDP packet of each state: float64 little endian [k, t, u, v, w, p, q, r, phi, theta, psi]
+PACKET_DTYPE = np.dtype("<f8")
+MAX_OVERRUN_TIMES = 100
+# When the run is behind the wall clock it does not wait, it only gives the
+# consumers a turn every YIELD_INTERVAL seconds so it can catch up
+YIELD_INTERVAL = 0.02
+
+
+def encode(k, t, x):
+    return np.concatenate(([k, t], x)).astype(PACKET_DTYPE).tobytes()
+
+
+def decode(packet):
+    """
+    (k, t, x) of a packet
+    """
+    values = np.frombuffer(packet, dtype=PACKET_DTYPE)
+    return int(values[0]), float(values[1]), values[2:].copy()
+
+
+class UdpPublisher:
+    """
+    Send every state as one datagram to address (host, port). Sending never
+    blocks the simulation, a datagram that can not be sent is dropped.
+    """
+    def __init__(self, address):
+        self.address = address
+        self.dropped = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def send(self, k, t, x):
+        try:
+            self.sock.sendto(encode(k, t, x), self.address)
+        except OSError:
+            self.dropped += 1
+
+    def close(self):
+        self.sock.close()
+
+
+def _publish(queue, item, report):
+    """
+    Put item in the queue without waiting, the oldest state is dropped when
+    the queue is full so a slow consumer never slows the simulation
+    """
+    if queue.full():
+        queue.get_nowait()
+        report.dropped += 1
+    queue.put_nowait(item)
+
+
+async def run_paced(sim, rate=1.0, queue=None, udp_address=None, on_overrun=None):
+    """
+    Advance sim (Simulate) one step at a time at rate times the wall clock
+    and publish every state (k, t, x) to an asyncio.Queue and/or over UDP.
+    None is put in the queue at the end.
+
+    on_overrun(k, t, step_time): called when a step takes longer than dt/rate
+    Output: PacingReport
+    """
+    if rate <= 0:
+        raise ValueError(f'rate has to be > 0, got {rate}')
+    time_grid = sim.time_grid()
+    report = PacingReport(rate=rate, budget=sim.pars.dt/rate)
+    publisher = None if udp_address is None else UdpPublisher(udp_address)
+    steps = sim._steps(time_grid)
+    start = time.perf_counter()
+    last_yield = start
+    try:
+        while True:
+            step_start = time.perf_counter()
+            try:
+                k, x = next(steps)
+            except StopIteration:
+                break
+            step_time = time.perf_counter() - step_start
+            t = time_grid[k]
+            report.steps += 1
+            report.total_step_time += step_time
+            report.max_step_time = max(report.max_step_time, step_time)
+            if k > 0 and step_time > report.budget:
+                report.overruns += 1
+                if len(report.overrun_times) < MAX_OVERRUN_TIMES:
+                    report.overrun_times.append(float(t))
+                if on_overrun is not None:
+                    on_overrun(k, t, step_time)
+            # Wait until the wall clock reaches the simulated time
+            wait = start + (t - time_grid[0])/rate - time.perf_counter()
+            report.max_lateness = max(report.max_lateness, -wait)
+            if wait > 0 or time.perf_counter() - last_yield > YIELD_INTERVAL:
+                await asyncio.sleep(max(wait, 0)) # also lets the consumers run
+                last_yield = time.perf_counter()
+            x = np.array(x[:9], dtype=float) # without the position of the ISA runs
+            if queue is not None:
+                _publish(queue, (k, t, x), report)
+            if publisher is not None:
+                publisher.send(k, t, x)
+    finally:
+        if queue is not None:
+            _publish(queue, None, report)
+        if publisher is not None:
+            report.dropped += publisher.dropped
+            publisher.close()
+    report.wall_time = time.perf_counter() - start
+    if report.overruns:
+        warnings.warn(
+            f"{report.overruns} of {report.steps} steps took longer than "
+            f"dt/rate = {report.budget:.4g} s (max {report.max_step_time:.4g} s)"
+        )
+    return report
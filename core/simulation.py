@@ -1,10 +1,143 @@
+import importlib.util
+import time
+import warnings
 import numpy as np
 from core.aircraft_model import AircraftModel
+from core.integrators import make_integrator
+from core import realtime
+from core.control_schedule import ControlSchedule
+from core.atmosphere import atmosphere_from_dict
+from core.trim import Trim
+from core.trajectory import Trajectory, POSITION_COLUMNS
+
+STATE_COLUMNS = ["u","v","w","p","q","r","phi","theta","psi"]
+ABG_COLUMNS = ["alpha","beta","gamma"]
+
 class Simulate:
-    def __init__(self,ac_params,params):
-        self.model = AircraftModel(ac_params)
-        self.pars = params
-    def simulate(self,):
+    def __init__(self,ac_params,params,stats=None,cache=None):
+        """
+        stats: optional RunStats, filled with the counters and timings of
+        each run (see core/instrumentation.py)
+        cache: optional ResultCache (service/result_cache.py), simulate
+        returns the saved states of an identical run without integrating
+        (stats and nfev are not updated then)
+        """
+        self.model = AircraftModel(ac_params,atmosphere_from_dict(getattr(params,"atmosphere",None)))
+        # With an atmosphere that changes with altitude the position is
+        # integrated too, the states have 12 variables inside the loop
+        self.tracks_position = self.model.atmosphere.varies_with_altitude
+        self.pars = self.trimmed(ac_params,params,self.model.atmosphere)
+        self.stats = stats
+        self.cache = cache
+        self.nfev = 0 # Number of xdot evaluations of the last run
+    @staticmethod
+    def trimmed(ac_params,params,atmosphere=None):
+        """
+        params starting from the equilibrium of its "trim" block, X and U
+        are replaced by the solution of Trim (solved once, then read from
+        the trim cache). params without trim are returned as they are.
+
+            "trim": {"airspeed": 90, "gamma": 0.0, "altitude": 1000}
+
+        gamma is 0 (level flight) and altitude is -position0[2] if missing,
+        the run starts at the trim altitude (see Trim.apply)
+        """
+        trim = getattr(params,"trim",None)
+        if not trim:
+            return params
+        position0 = np.asarray(getattr(params,"position0",np.zeros(3)),dtype=float)
+        point = Trim(ac_params,atmosphere=atmosphere).solve(
+            trim["airspeed"],
+            altitude=trim.get("altitude",-position0[2]),
+            gamma=trim.get("gamma",0.0),
+        )
+        if not point.converged:
+            raise ValueError(
+                f'trim {dict(trim)} did not converge (residual {np.linalg.norm(point.residual):.3g}), '
+                f'the aircraft can not hold it inside the control limits'
+            )
+        return Trim.apply(params,point)
+    @staticmethod
+    def columns(return_abg=False,return_position=False):
+        """
+        Names of the columns of the states matrix returned by simulate
+        """
+        columns = list(STATE_COLUMNS)
+        if return_abg:
+            columns += ABG_COLUMNS
+        if return_position:
+            columns += POSITION_COLUMNS
+        return columns + ["time"]
+    @staticmethod
+    def columns_of(n_cols):
+        """
+        Names of the columns of a states matrix with n_cols columns
+        """
+        for return_abg in (False,True):
+            for return_position in (False,True):
+                columns = Simulate.columns(return_abg,return_position)
+                if len(columns) == n_cols:
+                    return columns
+        raise ValueError(f'{n_cols} columns NOT IS A Simulate OUTPUT, give the columns')
+    @staticmethod
+    def aero_angles(states):
+        """
+        This function is used for calculate the aerondynamics angles of the states.
+
+        INPUT:
+            states: State vectors, shape (...,9) or more columns
+                states = [u,v,w,p,q,r,phi,theta,psi,...]
+
+        OUTPUT:
+            aerodynamic angles, shape (...,3)
+                aerodynamic angles = [alpha,beta,gamma]
+        """
+        u,v,w,theta = states[...,0],states[...,1],states[...,2],states[...,7]
+        Va = np.sqrt(u**2 + v**2 + w**2)
+        Va = np.where(Va < 1e-6, 1e-6, Va)
+        alpha = np.arctan2(w,u)
+        beta = np.arcsin(np.clip(v/Va, -1, 1))
+        gamma = theta - alpha
+        return np.stack((alpha,beta,gamma),axis=-1)
+    def control_schedule(self,time_grid):
+        """
+        Controls compiled on time_grid (CompiledSchedule), callable u(t)
+        """
+        return ControlSchedule.from_config(self.pars).compile(time_grid)
+    def _rhs(self,t,x):
+        """
+        Derivative function used by the integrator, f(t,x) = xdot(x,U(t))
+        """
+        self.nfev += 1
+        return self.model.xdot(x,self._schedule(t),t)
+    def time_grid(self):
+        """
+        Output times, 0, dt, 2*dt, ... <= time
+        """
+        n_steps = int(np.floor(self.pars.time/self.pars.dt + 1e-9))
+        return np.arange(n_steps + 1)*self.pars.dt
+    def trajectory(self):
+        """
+        Trajectory starting at the position0 of the simulation config
+        """
+        return Trajectory(getattr(self.pars,"position0",(0,0,0)))
+    def _post(self,block,return_abg,trajectory):
+        """
+        Fill the columns computed from the states, in place
+        """
+        col = 9
+        if return_abg:
+            block[:,col:col + 3] = self.aero_angles(block)
+            col += 3
+        if trajectory is not None:
+            positions = trajectory.update(block,block[:,-1])
+            if self.tracks_position:
+                # north, east, down were integrated with the states (written
+                # by _blocks), the trapezoidal reconstruction only gives the angles
+                positions[:,0:3] = block[:,col:col + 3]
+                positions[:,3] = -positions[:,2]
+            block[:,col:col + len(POSITION_COLUMNS)] = positions
+    def simulate(self,return_abg=False,return_position=False):
         """
         The function simnulate the behavior of the A/C (aircraft) with
         cases like if the pilot deflect aleron, shut off a any engine
@@ -16,132 +149,273 @@ class Simulate:
             U = [delta_e, delta_a, delta_r, delta_t1, delta_t2]
             time: Time that the user wanna simulate
             dt: How many each do calculate the behavior
+            integrator: euler, rk4, semi_implicit or rk45 (adaptive, states
+            are interpolated at each dt)
+            backend: numpy, or numba for the compiled kernels (euler, rk4
+            and semi_implicit, sea level air only)
+            atmosphere: None for sea level air, or the config of
+            core/atmosphere.py (ISA, wind, gusts)
             da: Aleron deflection, degs
             eg: shutoff the engine. 1: shut off engine 1 , 2: shut off engine 2.
+            events: more inputs, steps and ramps on any control and engine
+            failures (see core/control_schedule.py)
+            return_abg: if True add the aerodynamic angles alpha, beta, gamma
+            return_position: if True add the inertial position (north, east,
+            down from position0), altitude, flight path and heading, see
+            core/trajectory.py
 
         Output:
         -------
-            states: Matrix with A/C in each dt.
-            states = size: [time/dt,14] 
-            
+            states: Matrix with A/C in each dt, written in a single buffer
+            allocated before the loop.
+            states = size: [time/dt+1,10], or [time/dt+1,13] with return_abg
+            (see Simulate.columns)
+
+            states = [
+            u0, v0, w0, p0, q0, r0, phi0, theta0, psi0, time_current0
+            u1, v1, w1, p1, q1, r1, phi1, theta1, psi1, time_current1
+            .
+            .
+            .
+            ]
+
+            with return_abg:
+
             states = [
             u0, v0, w0, p0, q0, r0, phi0, theta0, psi0, alpha0, beta0, gamma0, time_current0
             u1, v1, w1, p1, q1, r1, phi1, theta1, psi1, alpha1, beta1, gamma1, time_current1
-            u2, v2, w2, p2, q2, r2, phi2, theta2, psi2, alpha3, beta3, gamma3, time_current3
-            u3, v3, w3, p3, q3, r3, phi3, theta3, psi3, alpha4, beta4, gamma4, time_current4
             .
             .
             .
             ]
-        
-        """
-        def calc_abgVa(x,time_current):
-            """
-            This function is used for calculate the aerondynamics angles aditional add
-            the moment the calc.
-
-            PRINCIPLY WAS USE IN SIMULATE. So the redaction be focused in how is used in simulate
-
-            INPUT:
-        
-                x: State vector,
-                    x = [u,v,w,phi,theta,psi]
-                time_current: Time correspond to calc time
-                    time_current = type: float
-
-            OUTPUT:
-                aerodynamic angles
-                    aerodynamic angles = [alpha,beta,gamma,time_current], type = float
-
-            """
-            u,v,w,phi,theta,psi = x[0],x[1],x[2],x[6],x[7],x[8]
-
-            if  np.sqrt(u**2 + v**2 + w**2) < 1e-6:
-                Va = 1e-6
-            else:
-                Va = np.sqrt(u**2 + v**2 + w**2) 
-
-            alpha = np.arctan2(w,u)
-            beta = np.arcsin(np.clip(v/Va, -1, 1))
-            gamma = theta - alpha
-            return np.asarray([alpha,beta,gamma,time_current],dtype=float)
+
+            with return_position the columns north, east, down, altitude,
+            flight_path, heading go before time.
+
+        """
+        columns = self.columns(return_abg,return_position)
+        if self.cache is not None:
+            states = self.cache.get(self.model.ac_params,self.pars,columns)
+            if states is not None:
+                return states
+        time_grid = self.time_grid()
+        # Output buffer, one row per time in time_grid
+        # A single block, unpacking it runs the generator to the end
+        position_col = columns.index("north") if return_position else None
+        (states,) = self._blocks(time_grid,len(time_grid),len(columns),position_col)
+        self._post(states,return_abg,self.trajectory() if return_position else None)
+        if self.cache is not None:
+            self.cache.put(self.model.ac_params,self.pars,columns,states)
+        return states
+    def simulate_iter(self,chunk_size=1000,return_abg=False,return_position=False):
+        """
+        Same as simulate, but yield the states in blocks of chunk_size rows
+        while the simulation runs, so the memory does not depend on the
+        simulated time. Each block is a new array with the columns of
+        Simulate.columns(return_abg,return_position), the last block can be
+        shorter. The position continues from one block to the next.
+
+        Use with Save.s_stream for write long runs to disk:
+            Save.s_stream(sim.simulate_iter(), Simulate.columns())
+        """
+        time_grid = self.time_grid()
+        trajectory = self.trajectory() if return_position else None
+        columns = self.columns(return_abg,return_position)
+        position_col = columns.index("north") if return_position else None
+        for block in self._blocks(time_grid,chunk_size,len(columns),position_col):
+            self._post(block,return_abg,trajectory)
+            yield block
+    async def simulate_paced(self,rate=1.0,queue=None,udp_address=None,on_overrun=None):
+        """
+        Paced mode: the model advances at rate times the wall clock (1.0 real
+        time) with the numpy loop, one step at a time, and every state is
+        published while the run goes (see core/realtime.py).
+
+        Input:
+            rate: simulated seconds per wall clock second
+            queue: asyncio.Queue that receives (k, t, x) for each step and
+            None at the end, the oldest items are dropped if it is full
+            udp_address: (host, port) to send each state as a datagram of
+            float64 [k, t, x...], realtime.decode reads it back
+            on_overrun(k, t, step_time): a step took longer than dt/rate
+
+        Output: PacingReport with the overruns and the headroom of the model
+
+            report = asyncio.run(sim.simulate_paced(rate=2.0, udp_address=("127.0.0.1", 5005)))
+        """
+        return await realtime.run_paced(self,rate,queue,udp_address,on_overrun)
+    def _use_compiled(self):
+        """
+        True if the run goes to the numba kernels (backend = "numba")
+        """
+        if getattr(self.pars,"backend","numpy") != "numba":
+            return False
+        # numba (and core.compiled) are only imported when the backend is used,
+        # a numpy run or a batch worker does not pay its import time
+        if importlib.util.find_spec("numba") is None:
+            warnings.warn("numba is not installed, using the numpy backend")
+            return False
+        from core import compiled
+        if not self.model.atmosphere.is_default:
+            warnings.warn("the compiled kernels only have sea level air without wind, using the numpy backend")
+            return False
+        if self.pars.integrator not in compiled.METHODS:
+            warnings.warn(
+                f"{self.pars.integrator} is not compiled, using the numpy backend "
+                f"(compiled: {list(compiled.METHODS)})"
+            )
+            return False
+        return True
+    def _blocks(self,time_grid,chunk_size,n_cols,position_col=None):
+        """
+        Yield the output in blocks of chunk_size rows with n_cols columns,
+        states in the first 9 columns and time in the last one. When the
+        model integrates the position (tracks_position) north, east, down
+        go to the columns from position_col.
+        """
+        n_rows = len(time_grid)
+        def new_block(k0):
+            block = np.empty((min(chunk_size,n_rows - k0),n_cols),dtype=float)
+            block[:,-1] = time_grid[k0:k0 + len(block)]
+            return block
+        if self._use_compiled():
+            yield from self._compiled_blocks(time_grid,new_block)
+            return
+        store_position = self.tracks_position and position_col is not None
+        k0 = 0
+        block = new_block(k0)
+        for k,x in self._steps(time_grid):
+            block[k - k0,:9] = x[:9]
+            if store_position:
+                block[k - k0,position_col:position_col + 3] = x[9:12]
+            if k - k0 + 1 == len(block):
+                yield block
+                k0 = k + 1
+                if k0 < n_rows:
+                    block = new_block(k0)
+    def _compiled_blocks(self,time_grid,new_block):
+        """
+        _blocks with the numba backend, the kernel runs a full block at a time
+        """
+        from core import compiled
+        n_rows = len(time_grid)
+        c = compiled.pack(self.model.coefficients)
+        ai,af = compiled.pack_aero(self.model.coefficients.aero)
+        method = compiled.METHODS[self.pars.integrator]
+        # Controls at the start, middle and end of each step (RK4 stages)
+        steps = np.diff(time_grid)
+        controls = self.control_schedule(time_grid).stages()
+        x = np.asarray(self.pars.X,dtype=float)
+        stats = self.stats
+        if stats is not None:
+            stats.start(self.pars.integrator,"numba")
+        self.nfev = 0
+        first_fail = None
+        k0 = 0
+        while k0 < n_rows:
+            block = new_block(k0)
+            k1 = k0 + len(block)
+            if k0 == 0:
+                block[0,:9] = x
+            i0 = max(k0,1)
+            if k1 > i0:
+                if stats is not None:
+                    kernel_start = time.perf_counter()
+                block[i0 - k0:,:9] = compiled.integrate(
+                    x,c,ai,af,controls[i0-1:k1-1],steps[i0-1:k1-1],method
+                )
+                if stats is not None:
+                    stats.xdot_time += time.perf_counter() - kernel_start
+                x = block[-1,:9].copy()
+                self.nfev += (k1 - i0)*compiled.EVALS_PER_STEP[self.pars.integrator]
+            # Same warning of the numpy loop
+            if first_fail is None:
+                x_block = block[:,:9]
+                Va = np.sqrt(x_block[:,0]**2 + x_block[:,1]**2 + x_block[:,2]**2)
+                fail = (Va > 300) | np.any(np.abs(x_block[:,6:9]) > np.pi/2,axis=1)
+                fail[:i0 - k0] = False
+                if np.any(fail):
+                    first_fail = k0 + int(np.argmax(fail))
+                    if stats is not None:
+                        stats.fail(first_fail,time_grid[first_fail],block[first_fail - k0,:9])
+            if first_fail is not None:
+                for k in range(max(first_fail,k0),k1):
+                    if (k + 1)%2500 == 0:
+                        self._warn(k + 1,time_grid[k])
+            if stats is not None and stats.on_step is not None:
+                for k in range(k0,k1):
+                    stats.step(k,time_grid[k],block[k - k0,:9])
+            yield block
+            k0 = k1
+        if stats is not None:
+            stats.stop(n_rows - 1,self.nfev)
+        if self.pars.show == 1:
+            print(f"{self.pars.integrator} (numba): {self.nfev} function evaluations")
+    @staticmethod
+    def _warn(iter_counter,counter_time):
+        print(50*"*")
+        print(2*"\t","WARNING")
+        print("Simulation can not converge for")
+        print(f"Iteration:{iter_counter}","\twith\t",f"time: {round(counter_time,0)}s")
+        print(50*"*")
+    def _steps(self,time_grid):
+        """
+        Run the integrator over time_grid, yield (k,x) for every step
+        including the initial state (k = 0). Show the progress and the
+        warning when the simulation diverge.
+        """
         # Extract parameters
-        X = self.pars.X
-        U = self.pars.U
+        X = np.asarray(self.pars.X,dtype=float)
+        if self.tracks_position:
+            X = np.concatenate((X,np.asarray(getattr(self.pars,"position0",np.zeros(3)),dtype=float)))
         time = self.pars.time
-        dt = self.pars.dt
-        da = self.pars.da
-        da_sta = self.pars.da_start
-        da_end = self.pars.da_end
-        eg_time = self.pars.eg_time
-        eg = self.pars.eg
         show = self.pars.show
-        iter_counter = 0
-        counter_time = 0
-        deg2rad = np.pi/180 # Convert degree to radian
-        # Extract control variables        
-        u1,u2,u3 = U[0:3]
-        U = np.array([u1,u2,u3,U[3],U[4]])
+        integrator = make_integrator(
+            self.pars.integrator,
+            kinematics=AircraftModel.kinematics,
+            rtol=self.pars.rtol,
+            atol=self.pars.atol,
+        )
+        self.nfev = 0
+        self._schedule = self.control_schedule(time_grid)
+        stats = self.stats
+        rhs = self._rhs
+        if stats is not None:
+            stats.start(self.pars.integrator,"numpy")
+            rhs = stats.timed(rhs)
+        n_steps = len(time_grid) - 1
+        progress_every = max(n_steps//20,1) # Show the progress each 5 %
         # Save initial moment
-        states = [X]
-        states_abg = [calc_abgVa(X,counter_time)]
-        time_vector = [0]
+        yield 0,X
+        if stats is not None:
+            stats.step(0,time_grid[0],X)
         # Initial conditions for the loop
-        iter_counter =+ 1
-        counter_time =+ dt
-        # Save x,U for start simulation.
-        x_current = X.copy()
-        U_initial = U.copy()
+        iter_counter = 1
         iter_fail = None ## If simulation tend to infinite -> Show warning in the terminal
-        
-        while counter_time <= time:
-            U = U_initial.copy()
-            # If the user wanna case simulate with aleron deflection 
-            if da != 0.0:
-                if da_sta <= counter_time <= da_end:
-                    U[0] += da # rad
-            # If the user wanna case simulate with engine fail Eg
-            if eg_time != 0:
-                if counter_time >= eg_time:
-                    if eg == 1:
-                        U[3] = 0 # shut off engine 1
-                    elif eg == 2:
-                        U[4] = 0 # swut off engine 2
-                    elif eg == 3:
-                        U[3] = 0
-                        U[4] = 0
-                # Euler explicit integration
-            x_dot_current = self.model.xdot(x_current, U)
-            x_next = x_current + x_dot_current*dt
+
+        for x_next in integrator.integrate(rhs,X.copy(),time_grid):
+            counter_time = time_grid[iter_counter]
+            yield iter_counter,x_next
             # Conditions for active warning
             Va = np.sqrt(x_next[0]**2 + x_next[1]**2 + x_next[2]**2)
             if Va > 300 or np.any(np.abs(x_next[6:9]) > np.pi/2):
+                if iter_fail is None and stats is not None:
+                    stats.fail(iter_counter,counter_time,x_next)
                 iter_fail = True
-            states_abg.append(calc_abgVa(x_next,counter_time))
-            states.append(x_next) # Add X to state
-            time_vector.append(counter_time)
+            if stats is not None:
+                stats.step(iter_counter,counter_time,x_next)
             # Fresh conditions for next iteration
-            x_current = x_next
-            counter_time += dt
             iter_counter += 1
             if show == 1: # Show simulate progress
-                progress = counter_time/time
-                if progress < 1:
-                    if progress * 100 % 5 == 0:
-                        print(
-                            f"{counter_time/time*100:.2f}%      Iteration N°{iter_counter}"
-                        )
+                if (iter_counter - 1)%progress_every == 0 and counter_time < time:
+                    print(
+                        f"{counter_time/time*100:.2f}%      Iteration N°{iter_counter}"
+                    )
             if iter_fail is not None: # Print state if will not converge
                 if iter_counter%2500 == 0:
-                    print(50*"*")
-                    print(2*"\t","WARNING")
-                    print("Simulation can not converge for")
-                    print(f"Iteration:{iter_counter}","\twith\t",f"time: {round(counter_time,0)}s")
-                    print(50*"*")
-            
-            
-        #
-        states = np.asarray(states,dtype=float)
-        time_vector = np.asarray(time_vector,dtype=float).reshape(-1,1)
-        states = np.hstack((states,time_vector))
-        return states
+                    self._warn(iter_counter,counter_time)
+
+        if stats is not None:
+            stats.stop(n_steps,self.nfev)
+        if show == 1:
+            print(f"{self.pars.integrator}: {self.nfev} function evaluations")
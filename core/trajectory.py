@@ -0,0 +1,76 @@
+import numpy as np
+from core.operations import Operations
+
+POSITION_COLUMNS = ["north","east","down","altitude","flight_path","heading"]
+
+
+class Trajectory:
+    """
+    Inertial position of the A/C from the states of Simulate.
+
+    The body velocities are rotated to earth axes (north, east, down) with
+    Operations.body_to_inertial for all the rows at once and integrated with
+    the trapezoidal rule. The object keeps the last position and velocity,
+    so blocks of simulate_iter are integrated one after the other:
+
+        trajectory = Trajectory(position0)
+        for block in sim.simulate_iter():
+            positions = trajectory.update(block, block[:,-1])
+    """
+    def __init__(self,position0=(0,0,0)):
+        """
+        position0: initial position [north, east, down], m
+        """
+        self.position0 = np.asarray(position0,dtype=float)
+        self.reset()
+
+    def reset(self):
+        self._position = self.position0.copy()
+        self._velocity = None # velocity (earth axes) and time of the last row
+        self._time = None
+
+    def update(self,states,time):
+        """
+        Positions of the next rows
+
+        Input:
+            states: shape (N,9) or more columns, [u,v,w,p,q,r,phi,theta,psi,...]
+            time: shape (N,)
+        Output: shape (N,6), columns POSITION_COLUMNS
+            north, east, down: m
+            altitude: -down, m
+            flight_path: angle of the velocity over the horizon, rad
+            heading: angle of the ground track from north, rad
+        """
+        time = np.asarray(time,dtype=float)
+        out = np.empty((len(time),len(POSITION_COLUMNS)))
+        if len(time) == 0:
+            return out
+        v_ned = Operations.body_to_inertial(states)
+        if self._velocity is None:
+            # First row is the initial position
+            v_prev = np.vstack((v_ned[:1],v_ned[:-1]))
+            t_prev = np.concatenate((time[:1],time[:-1]))
+        else:
+            v_prev = np.vstack((self._velocity[None,:],v_ned[:-1]))
+            t_prev = np.concatenate(([self._time],time[:-1]))
+        increments = (v_prev + v_ned)/2*(time - t_prev)[:,None]
+        out[:,0:3] = self._position + np.cumsum(increments,axis=0)
+        out[:,3] = -out[:,2]
+        v_ground = np.sqrt(v_ned[:,0]**2 + v_ned[:,1]**2)
+        out[:,4] = np.arctan2(-v_ned[:,2],v_ground)
+        out[:,5] = np.arctan2(v_ned[:,1],v_ned[:,0])
+        self._position = out[-1,0:3].copy()
+        self._velocity = v_ned[-1]
+        self._time = time[-1]
+        return out
+
+    @staticmethod
+    def reconstruct(states,time=None,position0=(0,0,0)):
+        """
+        Positions of a complete run, time defaults to the last column of states
+        """
+        states = np.asarray(states,dtype=float)
+        if time is None:
+            time = states[:,-1]
+        return Trajectory(position0).update(states,time)
@@ -0,0 +1,179 @@
+import dataclasses
+import hashlib
+import json
+import os
+import numpy as np
+from core.aircraft_model import AircraftModel, MODEL_VERSION
+from core.atmosphere import Atmosphere
+from domain.trim_point import TrimPoint
+
+TRIM_CACHE_DIR = "data/trim_cache"
+
+
+class Trim:
+    """
+    Trim solver, find X,U with xdot(X,U) = 0 for steady wings level flight
+    (level or climbing) at a given airspeed and flight path angle.
+
+    Unknowns: z = [alpha, delta_elevator, throttle] (same throttle in both engines)
+    Equations: u_dot = w_dot = q_dot = 0, the other derivatives are zero by
+    symmetry (v = p = q = r = phi = 0, theta = alpha + gamma).
+
+    The system is solved with damped Gauss-Newton (least squares), the
+    Jacobian by finite differences of the 3 unknowns evaluated in one
+    AircraftModel.xdot_batch call. Solutions are saved on disk, keyed by
+    the hash of MODEL_VERSION, the aircraft parameters and the flight condition.
+    """
+    deg2rad = np.pi/180
+    # Bounds of the unknowns: linear lift region, elevator and throttle limits of the model
+    LOWER = np.array([-10*deg2rad, -25*deg2rad, 0.5*deg2rad])
+    UPPER = np.array([14.5*deg2rad, 25*deg2rad, 10*deg2rad])
+
+    def __init__(self, ac_params, cache_dir=TRIM_CACHE_DIR, atmosphere=None):
+        """
+        ac_params: AircraftParameters
+        cache_dir: folder of the trim cache, None disables the cache
+        atmosphere: core.atmosphere model, None for sea level air. Wind and
+        gusts are ignored, the trim is respect to the air mass
+        """
+        self.ac_params = ac_params
+        self.atmosphere = (Atmosphere() if atmosphere is None else atmosphere).still()
+        self.model = AircraftModel(ac_params, self.atmosphere)
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def state(z, airspeed, gamma, psi=0.0):
+        """
+        State and controls of the unknowns z = [alpha, delta_elevator, throttle]
+        """
+        alpha, delta_e, throttle = z
+        X = np.array([
+            airspeed*np.cos(alpha), 0, airspeed*np.sin(alpha),
+            0, 0, 0,
+            0, alpha + gamma, psi
+        ])
+        U = np.array([0, delta_e, 0, throttle, throttle])
+        return X, U
+
+    def _key(self, airspeed, altitude, gamma):
+        condition = json.dumps([float(airspeed), float(altitude), float(gamma)])
+        # The equations are part of the key, a new model version solves again
+        text = MODEL_VERSION + self.ac_params.digest() + condition
+        if not self.atmosphere.is_default:
+            text += json.dumps(self.atmosphere.to_dict(), sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = os.path.join(self.cache_dir, key + ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            point = TrimPoint.from_dict(json.load(f))
+        point.iterations = 0
+        return point
+
+    def _store(self, key, point):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, key + ".json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(point.to_dict(), f)
+        os.replace(tmp, path) # Atomic, parallel sweeps never read a half written file
+
+    def residual(self, z, airspeed, gamma, altitude=0.0):
+        """
+        [u_dot, w_dot, q_dot] for the unknowns z
+        """
+        X, U = self.state(z, airspeed, gamma)
+        return self.model.xdot(X, U, altitude=altitude)[[0, 2, 4]]
+
+    def jacobian(self, z, airspeed, gamma, eps=1e-7, altitude=0.0):
+        """
+        Residual and forward difference Jacobian, all in one batched evaluation
+        """
+        Z = np.tile(z, (4, 1))
+        steps = eps*np.maximum(np.abs(z), 1)
+        Z[1:] += np.diag(steps)
+        states, controls = zip(*(self.state(zi, airspeed, gamma) for zi in Z))
+        F = self.model.xdot_batch(np.array(states), np.array(controls), altitude=altitude)[:, [0, 2, 4]]
+        return F[0], ((F[1:] - F[0])/steps[:, None]).T
+
+    def solve(self, airspeed, altitude=0.0, gamma=0.0, z0=None, tol=1e-9, max_iter=50, use_cache=True):
+        """
+        Trim at a flight condition
+
+        Input:
+            airspeed: m/s
+            altitude: m, density of the atmosphere of the solver at this
+            altitude (same at any altitude for the constant air)
+            gamma: flight path angle, rad. 0 level flight, > 0 climb
+            z0: first guess [alpha, delta_elevator, throttle]
+            tol: tolerance of the residual norm
+            use_cache: look for and save the solution in the cache
+
+        Output:
+            TrimPoint
+        """
+        key = self._key(airspeed, altitude, gamma)
+        if use_cache:
+            point = self._load(key)
+            if point is not None:
+                return point
+        z = np.array([0.05, 0.0, 0.05] if z0 is None else z0, dtype=float)
+        r, J = self.jacobian(z, airspeed, gamma, altitude=altitude)
+        iterations = 0
+        while np.linalg.norm(r) > tol and iterations < max_iter:
+            step = np.linalg.lstsq(J, -r, rcond=None)[0]
+            # Backtracking, accept the first step that reduce the residual
+            lam = 1.0
+            while lam > 1e-4:
+                z_new = np.clip(z + lam*step, self.LOWER, self.UPPER)
+                r_new = self.residual(z_new, airspeed, gamma, altitude)
+                if np.linalg.norm(r_new) < np.linalg.norm(r):
+                    break
+                lam /= 2
+            else:
+                break # No descent, stuck at a bound or singular Jacobian
+            z = z_new
+            r, J = self.jacobian(z, airspeed, gamma, altitude=altitude)
+            iterations += 1
+        X, U = self.state(z, airspeed, gamma)
+        point = TrimPoint(
+            X=X,
+            U=U,
+            airspeed=float(airspeed),
+            altitude=float(altitude),
+            gamma=float(gamma),
+            residual=self.model.xdot(X, U.copy(), altitude=altitude),
+            converged=bool(np.linalg.norm(r) <= tol),
+            iterations=iterations,
+        )
+        if use_cache and point.converged:
+            self._store(key, point)
+        return point
+
+    @staticmethod
+    def apply(sim_params, point):
+        """
+        Copy of SimulationParameters starting from the trim point, X, U and
+        the down of position0 (-point.altitude), so the run starts at the
+        altitude of the equilibrium.
+
+        A position0 at sea level (the default) is moved to the trim altitude,
+        any other down must agree with it (ValueError).
+        """
+        position0 = np.array(getattr(sim_params, "position0", np.zeros(3)), dtype=float)
+        down = -float(point.altitude)
+        if position0[2] != 0 and not np.isclose(position0[2], down, rtol=0, atol=1e-6):
+            raise ValueError(
+                f'position0 down {position0[2]} does not match the trim altitude {point.altitude} m, '
+                f'remove the altitude of the trim or change position0'
+            )
+        position0[2] = down
+        return dataclasses.replace(
+            sim_params, X=point.X.copy(), U=point.U.copy(), position0=position0
+        )
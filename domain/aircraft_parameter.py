@@ -1,5 +1,33 @@
+import hashlib
+import json
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+
+
+class FrozenDict(dict):
+    """
+    dict that can not be modified, see AircraftParameters.__setattr__
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("the config is read only, assign a new dict to the field")
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """
+    Read only copy of a parsed json value: dicts as FrozenDict, lists as tuples
+    """
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
 @dataclass
 class AircraftParameters:
     """
@@ -18,4 +46,43 @@ class AircraftParameters:
     alpha_0: float
     n: float
     s_t: float
-    l_t: float
\ No newline at end of file
+    l_t: float
+    aero: dict = None # aero tables (core/aero_database.py), None for the equations of the model
+
+    def __setattr__(self, name, value):
+        """
+        Every assignment bumps a revision counter, so models that cache data
+        derived from these parameters (AircraftModel.coefficients) know when to
+        recompile. Arrays are stored as read only copies, in-place edits like
+        ac_params.inertia_matrix[0,0] = 1 raise instead of being missed. Dicts
+        (aero) are frozen the same way, ac_params.aero["cd"] = ... raises.
+        """
+        if isinstance(value, np.ndarray):
+            value = np.array(value, dtype=float)
+            value.flags.writeable = False
+        elif isinstance(value, dict):
+            value = freeze(value)
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_revision", getattr(self, "_revision", 0) + 1)
+
+    @property
+    def revision(self):
+        return self._revision
+
+    def to_dict(self):
+        """
+        Fields as plain python values (arrays as lists), ready for json
+        """
+        return {
+            f.name: getattr(self, f.name).tolist()
+            if isinstance(getattr(self, f.name), np.ndarray) else getattr(self, f.name)
+            for f in fields(self)
+        }
+
+    def digest(self):
+        """
+        Stable hash of the parameters (sha256 of the sorted json), used as
+        key of the on-disk caches
+        """
+        text = json.dumps(self.to_dict(), sort_keys=True, default=float)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,28 @@
+import numpy as np
+from dataclasses import dataclass
+@dataclass
+class LinearModel:
+    """
+    Linear model around an operating point, x_dot = A@dx + B@du
+
+    A: state matrix, 9x9
+    B: control matrix, 9x5
+    X: state of the operating point
+    U: controls of the operating point
+    eigenvalues: eigenvalues of A
+    modes: dynamic modes, dict name -> {"eigenvalue","wn","zeta","period"}
+    (short_period, phugoid, dutch_roll, roll, spiral). A mode is None
+    when it does not show up, e.g. a short period split in two real roots.
+    """
+    A: np.ndarray
+    B: np.ndarray
+    X: np.ndarray
+    U: np.ndarray
+    eigenvalues: np.ndarray
+    modes: dict
+
+    def is_stable(self, tol=1e-9):
+        """
+        True if no mode grows (heading psi gives a zero eigenvalue)
+        """
+        return bool(np.all(self.eigenvalues.real <= tol))
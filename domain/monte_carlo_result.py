@@ -0,0 +1,34 @@
+import numpy as np
+from dataclasses import dataclass
+@dataclass
+class MonteCarloResult:
+    """
+    Percentile envelopes of a Monte Carlo run
+
+    time: time of each step, shape (n_steps,)
+    percentiles: percentiles of the envelopes, like [1,5,50,95,99]
+    envelopes: shape (n_steps, len(percentiles), 9), value of each percentile
+    of the 9 states across the samples at each step
+    mean: mean of the states across the samples, shape (n_steps, 9)
+    n_samples: number of trajectories
+    n_failed: trajectories that hit the divergence warning (Va > 300,
+    Euler angles > pi/2 or states not finite) at least once, or that rk45
+    stopped. The envelopes and the mean leave out the states that are not
+    finite, a stopped sample keeps its last state
+    columns: names of the 9 states
+    """
+    time: np.ndarray
+    percentiles: np.ndarray
+    envelopes: np.ndarray
+    mean: np.ndarray
+    n_samples: int
+    n_failed: int
+    columns: list
+
+    def envelope(self, column, percentile):
+        """
+        Time history of one percentile of one state, e.g. envelope("theta", 95)
+        """
+        i = self.columns.index(column)
+        j = int(np.flatnonzero(np.isclose(self.percentiles, percentile))[0])
+        return self.envelopes[:, j, i]
@@ -0,0 +1,52 @@
+from dataclasses import dataclass, field
+@dataclass
+class PacingReport:
+    """
+    Timing of a paced (real time) run
+
+    rate: simulated seconds per wall clock second (1.0 real time)
+    budget: wall time available for each step, dt/rate, s
+    steps: steps published
+    overruns: steps whose computation took longer than budget
+    overrun_times: simulated time of the first overruns (up to 100)
+    max_step_time: longest computation of one step, s
+    total_step_time: sum of the computation of all the steps, s
+    max_lateness: most the run was behind the wall clock, s
+    dropped: states removed from a full queue before the consumer read them
+    wall_time: duration of the run, s
+    """
+    rate: float
+    budget: float
+    steps: int = 0
+    overruns: int = 0
+    overrun_times: list = field(default_factory=list)
+    max_step_time: float = 0.0
+    total_step_time: float = 0.0
+    max_lateness: float = 0.0
+    dropped: int = 0
+    wall_time: float = 0.0
+
+    def mean_step_time(self):
+        return self.total_step_time/self.steps if self.steps else 0.0
+
+    def headroom(self):
+        """
+        Fraction of the step budget left on average, 0.75 means the model
+        uses a quarter of the time it has; negative if it can not keep up
+        """
+        return 1 - self.mean_step_time()/self.budget
+
+    def summary(self):
+        return {
+            "rate": self.rate,
+            "budget_s": self.budget,
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "overrun_times": list(self.overrun_times),
+            "mean_step_time_s": self.mean_step_time(),
+            "max_step_time_s": self.max_step_time,
+            "max_lateness_s": self.max_lateness,
+            "headroom": self.headroom(),
+            "dropped": self.dropped,
+            "wall_time_s": self.wall_time,
+        }
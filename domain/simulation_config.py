@@ -1,5 +1,7 @@
+import hashlib
+import json
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 @dataclass
 class SimulationParameters:
     """
@@ -15,4 +17,33 @@ class SimulationParameters:
     eg:float
     eg_time:float
     show:float
-    
\ No newline at end of file
+    integrator:str = "euler"
+    rtol:float = 1e-6
+    atol:float = 1e-8
+    backend:str = "numpy"
+    events:list = field(default_factory=list)
+    position0:np.ndarray = field(default_factory=lambda: np.zeros(3)) # north, east, down, m
+    atmosphere:dict = None # core/atmosphere.py config, None for sea level air
+    trim:dict = None # start from the equilibrium {"airspeed","gamma","altitude"}, see Simulate.trimmed
+
+    def to_dict(self):
+        """
+        Fields as plain python values (arrays as lists), ready for json
+        """
+        return {
+            f.name: getattr(self, f.name).tolist()
+            if isinstance(getattr(self, f.name), np.ndarray) else getattr(self, f.name)
+            for f in fields(self)
+        }
+
+    def digest(self, ignore=()):
+        """
+        Stable hash of the parameters that change the result (sha256 of the
+        sorted json, show is left out), used as key of the on-disk caches
+        Input: ignore, more fields left out of the hash
+        """
+        data = self.to_dict()
+        for name in ("show",) + tuple(ignore):
+            data.pop(name, None)
+        text = json.dumps(data, sort_keys=True, default=float)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
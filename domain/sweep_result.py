@@ -0,0 +1,38 @@
+import numpy as np
+from dataclasses import dataclass, field
+@dataclass
+class SweepResults:
+    """
+    Results of a parameter sweep
+
+    cases: overrides of each case, like {"m": 240000.0}
+    states: states matrix of each case (same order as cases)
+    columns: names of the columns of the states matrices
+    """
+    cases: list
+    states: list
+    columns: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.cases)
+
+    def __iter__(self):
+        return iter(zip(self.cases, self.states))
+
+    def labels(self):
+        """
+        Text label of each case, like "m=240000.0, dt=0.1"
+        """
+        return [
+            ", ".join(f"{k}={np.asarray(v).tolist()}" for k, v in case.items()) or "base"
+            for case in self.cases
+        ]
+
+    def get(self, **overrides):
+        """
+        States of the case with the given overrides, e.g. results.get(m=240000.0)
+        """
+        for case, states in self:
+            if all(np.array_equal(case.get(k), v) for k, v in overrides.items()):
+                return states
+        raise KeyError(f"No case with {overrides}")
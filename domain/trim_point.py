@@ -0,0 +1,43 @@
+import numpy as np
+from dataclasses import dataclass
+@dataclass
+class TrimPoint:
+    """
+    Equilibrium point of the aircraft, xdot(X,U) = 0
+
+    X: trimmed state [u,v,w,p,q,r,phi,theta,psi]
+    U: trimmed controls [u1,u2,u3,u4,u5]
+    airspeed: m/s
+    altitude: m
+    gamma: flight path angle, rad
+    residual: xdot(X,U) at the solution
+    converged: True if the residual is below the tolerance
+    iterations: Newton iterations used (0 if loaded from the cache)
+    """
+    X: np.ndarray
+    U: np.ndarray
+    airspeed: float
+    altitude: float
+    gamma: float
+    residual: np.ndarray
+    converged: bool
+    iterations: int
+
+    def to_dict(self):
+        return {
+            "X": np.asarray(self.X).tolist(),
+            "U": np.asarray(self.U).tolist(),
+            "airspeed": self.airspeed,
+            "altitude": self.altitude,
+            "gamma": self.gamma,
+            "residual": np.asarray(self.residual).tolist(),
+            "converged": bool(self.converged),
+            "iterations": int(self.iterations),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        values = dict(data)
+        for key in ("X", "U", "residual"):
+            values[key] = np.array(values[key], dtype=float)
+        return cls(**values)
@@ -1,15 +1,51 @@
-from core.operations import Operations as ops
+import asyncio
+import time
 import numpy as np
 import pyvista as pv
+from core.operations import Operations
+from core.trajectory import Trajectory
 
 class FlightSimulation:
-    def __init__(self,mesh,dt):
+    def __init__(self,mesh,dt,lods=None):
+        """
+        mesh: mesh of the A/C
+        dt: time step of the states
+        lods: optional coarser versions of mesh (LoadFiles._load_mesh_lods),
+        the animation uses the finest one that is drawn within the frame time
+        """
         self.mesh = mesh
         self.dt = dt
-    def animation(self,states):
-        og_points = self.mesh.copy().points # Save original body
-        plotter = pv.Plotter()
-        plotter.add_mesh(self.mesh,opacity=0.8)
+        self.lods = [mesh] + [lod for lod in (lods or []) if lod is not mesh]
+        self.lod = 0 # index in lods of the mesh used by the last animation
+    def _pick_lod(self,plotter,frame_budget,samples=5):
+        """
+        Add the finest mesh of self.lods whose mean render time is under
+        frame_budget (the coarsest if none is), return it
+        """
+        for i,mesh in enumerate(self.lods):
+            plotter.add_mesh(mesh,opacity=0.8,name="aircraft")
+            if i == len(self.lods) - 1:
+                break
+            og_points = mesh.points.copy()
+            start = time.perf_counter()
+            for angle in np.linspace(0,0.1,samples):
+                mesh.points = og_points@Operations.body_rotation_matrix(angle,0,0).T
+                plotter.render()
+            mesh.points = og_points
+            if (time.perf_counter() - start)/samples <= frame_budget:
+                break
+        self.lod = i
+        return mesh
+    def _plotter(self,output,fps,frame_budget=None):
+        """
+        Plotter with the mesh and the axes, opened as a window (output None)
+        or as a .gif/.mp4 writer
+
+        frame_budget: render time allowed for a frame, s. None uses 1/fps in
+        a window and the finest mesh for a file
+        Output: (plotter, mesh drawn)
+        """
+        plotter = pv.Plotter(off_screen=output is not None)
         axis = [[1,0,0], [0,-1,0], [0,0,-1]]
         axs_colors = ["red", "green", "blue"]
         for i in range(len(axis)):
@@ -22,10 +58,142 @@ class FlightSimulation:
                 tip_length   = 0.15,
             )
             plotter.add_mesh(arrow, color=axs_colors[i])
-        plotter.show(interactive_update=True,auto_close=False) # Open the plotter window
-        for idx,_ in enumerate(states,0):
-            phi,theta,psi = states[idx,6:9]
-            R = ops.body_rotation_matrix(phi,theta,psi)
-            self.mesh.points = (R@og_points.T).T
-            plotter.update()
-        plotter.close()
\ No newline at end of file
+        if output is None:
+            plotter.show(interactive_update=True,auto_close=False) # Open the plotter window
+        elif output.endswith(".gif"):
+            plotter.open_gif(output,fps=fps)
+        else:
+            plotter.open_movie(output,framerate=fps)
+        if frame_budget is None and output is None:
+            frame_budget = 1/fps
+        if frame_budget is None or len(self.lods) == 1:
+            plotter.add_mesh(self.mesh,opacity=0.8,name="aircraft")
+            self.lod = 0
+            return plotter,self.mesh
+        return plotter,self._pick_lod(plotter,frame_budget)
+    def frame_timing(self,fps=30,speed=1.0):
+        """
+        Rows of states between two frames (stride) and the time a frame is
+        shown, s. The stride is rounded, so the frame time is stride*dt/speed
+        and not exactly 1/fps, pacing with it keeps speed times real time.
+        """
+        stride = max(int(round(speed/(fps*self.dt))),1)
+        return stride,stride*self.dt/speed
+    def frame_indices(self,n_states,fps=30,speed=1.0):
+        """
+        Rows of states shown at fps frames per second, speed times real time
+        """
+        stride,_ = self.frame_timing(fps,speed)
+        return np.arange(0,n_states,stride)
+    def animation(self,states,fps=30,speed=1.0,output=None,realtime=True,
+                  trajectory=None,scale=1.0,frame_budget=None):
+        """
+        Animate the attitude of the A/C
+
+        Input:
+            states: states matrix of Simulate (columns 6:9 are phi,theta,psi)
+            fps: frames per second, the states are decimated to the nearest
+            rate with a whole stride (see frame_timing)
+            speed: 1.0 real time, 2.0 twice as fast, ...
+            output: None for an interactive window, or a .mp4/.gif path to
+            render off screen (headless machines) into a video file
+            realtime: in the window, wait so the animation does not run
+            faster than speed times real time
+            trajectory: None to rotate the mesh in place, True to move it
+            along the position of Trajectory.reconstruct(states), or an
+            array (len(states),3) of positions north, east, down. The camera
+            follows the A/C.
+            scale: factor of the positions for the display
+            frame_budget: render time of a frame, s, to choose the level of
+            detail of the mesh (see __init__), None: 1/fps in a window, the
+            finest mesh for a file
+        """
+        frames = self.frame_indices(len(states),fps,speed)
+        _,frame_time = self.frame_timing(fps,speed)
+        # All the rotations at once, then one matmul per frame
+        euler = np.asarray(states[frames,6:9],dtype=float)
+        rotations = Operations.body_rotation_matrices(euler[:,0],euler[:,1],euler[:,2])
+        if trajectory is None:
+            positions = np.zeros((len(frames),3))
+        else:
+            if trajectory is True:
+                trajectory = Trajectory.reconstruct(states)[:,0:3]
+            positions = np.asarray(trajectory,dtype=float)[frames,0:3]*scale
+        # Files play at the frame rate of the decimated states
+        plotter,mesh = self._plotter(output,1/frame_time,frame_budget)
+        og_points = mesh.copy().points # Save original body
+        next_frame = time.perf_counter()
+        camera_position = np.array(plotter.camera.position)
+        camera_focus = np.array(plotter.camera.focal_point)
+        for R,position in zip(rotations,positions):
+            mesh.points = og_points@R.T + position
+            if trajectory is not None:
+                plotter.camera.position = camera_position + position
+                plotter.camera.focal_point = camera_focus + position
+            if output is None:
+                plotter.update()
+                if realtime:
+                    next_frame += frame_time
+                    wait = next_frame - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+            else:
+                plotter.write_frame()
+        mesh.points = og_points
+        plotter.close()
+        return output
+    async def follow(self,queue,fps=30,output=None,frame_budget=None,rate=1.0):
+        """
+        Animate the attitude of a live run, reading the (k, t, x) items that
+        Simulate.simulate_paced puts in queue until None. A frame is drawn
+        every stride states (see frame_timing, rate is the rate of the run),
+        the states received between two frames are skipped. In a file each
+        frame is written once per frame interval it covers, so the video
+        plays at rate times real time.
+        """
+        stride,frame_time = self.frame_timing(fps,rate)
+        plotter,mesh = self._plotter(output,1/frame_time,frame_budget)
+        og_points = mesh.copy().points # Save original body
+        frames = 0
+        last_frame = -1 # frame interval (k//stride) of the last frame drawn
+        try:
+            while True:
+                item = await queue.get()
+                # Keep only the newest state
+                while item is not None and not queue.empty():
+                    item = queue.get_nowait()
+                if item is None:
+                    break
+                k,t,x = item
+                frame = k//stride
+                if frame == last_frame:
+                    continue
+                next_frame = time.perf_counter() + frame_time
+                R = Operations.body_rotation_matrix(x[6],x[7],x[8])
+                mesh.points = og_points@R.T
+                if output is None:
+                    plotter.update()
+                else:
+                    for _ in range(frame - last_frame):
+                        plotter.write_frame()
+                last_frame = frame
+                frames += 1
+                await asyncio.sleep(max(next_frame - time.perf_counter(),0))
+        finally:
+            mesh.points = og_points
+            plotter.close()
+        return frames
+    def live(self,sim,rate=1.0,fps=30,output=None,udp_address=None):
+        """
+        Run sim (Simulate) in paced mode and animate it while it runs
+
+        Output: PacingReport of the run
+        """
+        async def run():
+            queue = asyncio.Queue(maxsize=256)
+            report,_ = await asyncio.gather(
+                sim.simulate_paced(rate=rate,queue=queue,udp_address=udp_address),
+                self.follow(queue,fps=fps,output=output,rate=rate),
+            )
+            return report
+        return asyncio.run(run())
@@ -1,35 +1,170 @@
+import numpy as np
 import matplotlib.pyplot  as plt
+from core.simulation import Simulate
+
+UNITS = {
+    "u": "m/s", "v": "m/s", "w": "m/s",
+    "p": "rad/s", "q": "rad/s", "r": "rad/s",
+    "phi": "rad", "theta": "rad", "psi": "rad",
+    "alpha": "rad", "beta": "rad", "gamma": "rad",
+    "north": "m", "east": "m", "down": "m", "altitude": "m",
+    "flight_path": "rad", "heading": "rad", "time": "s",
+}
+GROUPS = [["u","v","w"],["p","q","r"],["phi","theta","psi"]]
+
+
+class DecimatedLine:
+    """
+    Line that keeps the full data and draws a min/max decimated copy, about
+    two points per pixel of the axes. When the x limits change (zoom, pan)
+    the visible range is decimated again from the full data.
+    """
+    def __init__(self,ax,x,y,**kwargs):
+        self.ax = ax
+        self.x = np.asarray(x,dtype=float)
+        self.y = np.asarray(y,dtype=float)
+        (self.line,) = ax.plot([],[],**kwargs)
+        self.update()
+
+    def update(self,xlim=None):
+        if xlim is None:
+            i0,i1 = 0,len(self.x)
+        else:
+            # One more sample at each side, so the line reaches the borders
+            i0 = max(np.searchsorted(self.x,xlim[0],side="left") - 1,0)
+            i1 = min(np.searchsorted(self.x,xlim[1],side="right") + 1,len(self.x))
+        width = max(int(self.ax.get_window_extent().width),100)
+        self.line.set_data(*Interface.decimate(self.x[i0:i1],self.y[i0:i1],width))
+
 
 class Interface:
     """
-    
+    Plots of the states of Simulate. Columns are addressed by name (see
+    Simulate.columns) and long runs are drawn min/max decimated to the width
+    of the axes, so the spikes are kept and the plot does not stall.
     """
-    def plotter(states):
+    @staticmethod
+    def decimate(x,y,n_bins):
+        """
+        Split the samples in n_bins bins and keep the min and the max of each
+        one, in time order. Output: (x, y) with at most 2*n_bins points
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        n = len(y)
+        if n <= 2*n_bins:
+            return x,y
+        size = -(-n//n_bins)
+        n_bins = -(-n//size)
+        padded = np.full(n_bins*size,np.nan)
+        padded[:n] = y
+        padded = padded.reshape(n_bins,size)
+        finite = np.isfinite(padded)
+        low = np.where(finite,padded,np.inf).argmin(axis=1)
+        high = np.where(finite,padded,-np.inf).argmax(axis=1)
+        offset = np.arange(n_bins)*size
+        index = np.stack((np.minimum(low,high),np.maximum(low,high)),axis=1) + offset[:,None]
+        index = np.unique(index.ravel())
+        index = index[index < n]
+        return x[index],y[index]
+
+    @staticmethod
+    def _columns(states,columns=None):
+        return list(columns) if columns is not None else Simulate.columns_of(np.shape(states)[1])
+
+    @staticmethod
+    def _label(name):
+        unit = UNITS.get(name)
+        return f"{name}, {unit}" if unit else name
+
+    @staticmethod
+    def _connect(ax,lines):
+        """
+        Decimate the lines again when the x limits of ax change
+        """
+        def on_xlim(ax):
+            for line in lines:
+                line.update(ax.get_xlim())
+            ax.figure.canvas.draw_idle()
+        ax.callbacks.connect("xlim_changed",on_xlim)
+
+    @staticmethod
+    def plotter(states,columns=None,groups=None,show=True):
         """
         Plot simulation
 
         Input
         -----
-        states
-
-
-        """
-        body_speed = states[:,0:3]
-        angle_rates = states[:,3:6]
-        euler_angles = states[:,6:9]
-        vector = [body_speed,angle_rates,euler_angles]
-        time = states[:,9]
-        labels_bs = ["u, m/s", "v, m/s", "w, m/s"]
-        labels_ar = ["p, rad/s", "q, rad/s", "r, rad/s"]
-        labels_ea = ["phi, rad", "theta, rad", "psi, rad"]
-        vector_labels = [labels_bs,labels_ar,labels_ea]
-        fig, axs = plt.subplots(3,1)
-        for i in range(3):
-            for j in range(3):
-                axs[i].plot(time,vector[i][:,j],label=vector_labels[i][j])
-            axs[i].legend()
-            axs[i].grid()
-            
+        states: states matrix of Simulate
+        columns: names of the columns of states, None for the layout of
+        Simulate.columns (inferred from the number of columns)
+        groups: columns of each subplot, default u,v,w / p,q,r / phi,theta,psi
+        show: call plt.show
+
+        Output: the figure
+        """
+        columns = Interface._columns(states,columns)
+        groups = GROUPS if groups is None else groups
+        time = np.asarray(states[:,columns.index("time")])
+        fig, axs = plt.subplots(len(groups),1,sharex=True,squeeze=False)
+        axs = axs[:,0]
+        for ax,group in zip(axs,groups):
+            lines = [
+                DecimatedLine(ax,time,states[:,columns.index(name)],label=Interface._label(name))
+                for name in group
+            ]
+            Interface._connect(ax,lines)
+            ax.relim()
+            ax.autoscale_view()
+            ax.legend()
+            ax.grid()
+        axs[-1].set_xlabel("Time, s")
+        axs[-1].set_xlim(time[0],time[-1])
+        plt.tight_layout()
+        if show:
+            plt.show()
+        return fig
+
+    @staticmethod
+    def overlay(runs,names,labels=None,columns=None,show=True):
+        """
+        Overlay many runs, one subplot per column name
+
+        Input
+        -----
+        runs: list of states matrices, or a SweepResults (its case labels are used)
+            Interface.overlay(mass_sweep, ["u","theta"])
+        names: columns to plot, like ["u","theta"]
+        labels: legend of each run
+        columns: names of the columns of the runs, None for Simulate.columns
+        show: call plt.show
+
+        Output: the figure
+        """
+        if hasattr(runs,"labels") and hasattr(runs,"states"):
+            labels = runs.labels() if labels is None else labels
+            columns = runs.columns or columns
+            runs = runs.states
+        labels = [f"run {i}" for i in range(len(runs))] if labels is None else labels
+        fig, axs = plt.subplots(len(names),1,sharex=True,squeeze=False)
+        axs = axs[:,0]
+        t_min,t_max = np.inf,-np.inf
+        for ax,name in zip(axs,names):
+            lines = []
+            for states,label in zip(runs,labels):
+                run_columns = Interface._columns(states,columns)
+                time = np.asarray(states[:,run_columns.index("time")])
+                t_min,t_max = min(t_min,time[0]),max(t_max,time[-1])
+                lines.append(DecimatedLine(ax,time,states[:,run_columns.index(name)],label=label))
+            Interface._connect(ax,lines)
+            ax.relim()
+            ax.autoscale_view()
+            ax.set_ylabel(Interface._label(name))
+            ax.legend()
+            ax.grid()
         axs[-1].set_xlabel("Time, s")
+        axs[-1].set_xlim(t_min,t_max)
         plt.tight_layout()
-        plt.show()
+        if show:
+            plt.show()
+        return fig
@@ -0,0 +1,161 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from core.instrumentation import RunStats
+from core.simulation import Simulate
+from service.config import ConfigError
+from service.loader import LoadFiles
+from service.save import Save, OUTPUT_DIR
+from service.sweep import Sweep
+
+FORMATS = ["csv", "simb"]
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _run_job(job):
+    """
+    Worker, run one job of the manifest and stream its states to disk.
+    Errors are returned, so one bad run does not stop the others.
+    """
+    start = time.perf_counter()
+    result = {"name": job["name"], "aircraft": job["aircraft"], "simulation": job["simulation"]}
+    try:
+        ac_params = LoadFiles.aircraft(job["aircraft"])
+        sim_params = LoadFiles.simulation(job["simulation"])
+        ac_params, sim_params = Sweep.apply(ac_params, sim_params, job["overrides"])
+        sim_params.show = 0
+        stats = RunStats()
+        sim = Simulate(ac_params, sim_params, stats=stats)
+        blocks = sim.simulate_iter(
+            chunk_size=job["chunk_size"],
+            return_abg=job["return_abg"],
+            return_position=job["return_position"],
+        )
+        result["path"] = Save.s_stream(
+            blocks,
+            Simulate.columns(job["return_abg"], job["return_position"]),
+            directory=job["output"],
+            fmt=job["format"],
+            ac_params=ac_params,
+            sim_params=sim_params,
+            prefix=job["name"],
+        )
+        result.update(
+            status="ok",
+            steps=stats.steps,
+            nfev=stats.nfev,
+            simulate_s=stats.wall_time,
+            first_fail_time=stats.first_fail_time,
+        )
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["wall_time_s"] = time.perf_counter() - start
+    return result
+
+
+class Batch:
+    """
+    Run the aircraft x simulation configs of a manifest (jsonc):
+
+        {
+            "aircrafts": ["configs/aircrafts/aircraft.jsonc", ...],
+            "simulations": ["configs/simulation/simulation.jsonc", ...],
+            // optional
+            "runs": [{"aircraft": ..., "simulation": ..., "name": ..., "overrides": {"m": 240e3}}],
+            "format": "csv", // or simb
+            "output": "data/simulations_output",
+            "return_abg": false,
+            "return_position": false
+        }
+
+    Every aircraft is run with every simulation, plus the explicit runs.
+    Paths are relative to the working directory, like main.py.
+    """
+    @staticmethod
+    def jobs(manifest, fmt=None, output=None):
+        """
+        List of jobs of a parsed manifest, fmt and output replace the ones of
+        the manifest. Raise ConfigError if the manifest is not valid.
+        """
+        errors = []
+        fmt = fmt or manifest.get("format", "csv")
+        if fmt not in FORMATS:
+            errors.append(f'"format" has to be one of {FORMATS}, got {fmt!r}')
+        runs = []
+        for aircraft, simulation in itertools.product(
+            manifest.get("aircrafts", []), manifest.get("simulations", [])
+        ):
+            runs.append({"aircraft": aircraft, "simulation": simulation})
+        runs += list(manifest.get("runs", []))
+        if not runs:
+            errors.append('no runs, give "aircrafts" and "simulations" or "runs"')
+        jobs = []
+        names = set()
+        for i, run in enumerate(runs):
+            for key in ("aircraft", "simulation"):
+                if key not in run:
+                    errors.append(f'runs[{i}]: missing field "{key}"')
+                elif not os.path.isfile(run[key]):
+                    errors.append(f'runs[{i}]: {run[key]} NOT EXIST')
+            if "aircraft" not in run or "simulation" not in run:
+                continue
+            overrides = dict(run.get("overrides", {}))
+            name = run.get("name") or "_".join(
+                [_stem(run["aircraft"]), _stem(run["simulation"])]
+                + [f"{key}{value}" for key, value in overrides.items()]
+            )
+            if name in names:
+                errors.append(f'runs[{i}]: name {name} is repeated')
+            names.add(name)
+            jobs.append({
+                "name": name,
+                "aircraft": run["aircraft"],
+                "simulation": run["simulation"],
+                "overrides": overrides,
+                "format": fmt,
+                "output": output or manifest.get("output", OUTPUT_DIR),
+                "return_abg": bool(manifest.get("return_abg", False)),
+                "return_position": bool(manifest.get("return_position", False)),
+                "chunk_size": int(manifest.get("chunk_size", 10000)),
+            })
+        if errors:
+            raise ConfigError("manifest: " + "; ".join(errors))
+        return jobs
+
+    @staticmethod
+    def run(jobs, max_workers=1):
+        """
+        Run the jobs, max_workers processes (1 runs them in this process).
+        Output: one result dict per job, in the order of jobs
+        """
+        if max_workers == 1:
+            return list(map(_run_job, jobs))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_run_job, jobs))
+
+    @staticmethod
+    def summary(results, wall_time):
+        """
+        Timing table of the results, as text
+        """
+        width = max([len(r["name"]) for r in results] + [4])
+        lines = [f'{"name":<{width}}  {"status":<6}  {"steps":>8}  {"nfev":>8}  {"sim s":>8}  {"total s":>8}  output']
+        for r in results:
+            if r["status"] == "ok":
+                lines.append(
+                    f'{r["name"]:<{width}}  {"ok":<6}  {r["steps"]:>8}  {r["nfev"]:>8}  '
+                    f'{r["simulate_s"]:>8.3f}  {r["wall_time_s"]:>8.3f}  {r["path"]}'
+                )
+            else:
+                lines.append(f'{r["name"]:<{width}}  {"error":<6}  {r["error"]}')
+        n_ok = sum(r["status"] == "ok" for r in results)
+        busy = sum(r["wall_time_s"] for r in results)
+        lines.append(
+            f'{n_ok}/{len(results)} runs ok in {wall_time:.3f} s '
+            f'(sum of run times {busy:.3f} s)'
+        )
+        return "\n".join(lines)
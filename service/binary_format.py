@@ -0,0 +1,49 @@
+"""
+Binary result format (.simb)
+
+    bytes 0-7    magic b"NNSIM001"
+    bytes 8-15   length of the json header, little endian uint64
+    json header  utf-8, padded with spaces so the data starts at a multiple
+                 of 64 bytes. Keys: columns, dt, aircraft, simulation, created
+    data         float64 little endian, C order, rows of len(columns) values
+
+The number of rows is not stored, it comes from the file size, so the file
+can be written block by block while a simulation runs.
+"""
+import json
+import struct
+import numpy as np
+
+MAGIC = b"NNSIM001"
+EXTENSION = "simb"
+DTYPE = np.dtype("<f8")
+ALIGN = 64
+
+
+def write_header(f, meta):
+    """
+    Write magic and json header, return the offset of the data
+    """
+    header = json.dumps(meta, default=float).encode("utf-8")
+    prefix = len(MAGIC) + 8
+    padding = -(prefix + len(header)) % ALIGN
+    header += b" "*padding
+    f.write(MAGIC)
+    f.write(struct.pack("<Q", len(header)))
+    f.write(header)
+    return prefix + len(header)
+
+
+def read_header(path):
+    """
+    Read the header of a .simb file
+
+    Output: (meta dict, offset of the data in bytes)
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f'{path} NOT IS A {EXTENSION} FILE')
+        (length,) = struct.unpack("<Q", f.read(8))
+        meta = json.loads(f.read(length).decode("utf-8"))
+    return meta, len(MAGIC) + 8 + length
@@ -0,0 +1,241 @@
+import copy
+import os
+import warnings
+import numpy as np
+from core.integrators import INTEGRATORS
+
+SUPPORTED_UNITS = ["SI"]
+
+
+class ConfigError(ValueError):
+    """
+    Invalid config file, the message lists every problem found
+    """
+
+
+# Parsed files, abspath -> ((mtime_ns, size), data)
+_CACHE = {}
+
+
+def read_jsonc(path):
+    """
+    Parse a jsonc file. The result is cached by path and modification time,
+    a file is parsed again only when it changes. A copy is returned, so the
+    caller can modify it.
+    """
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    entry = _CACHE.get(key)
+    if entry is None or entry[0] != version:
+        import jstyleson # only needed when a file is parsed
+        with open(path, 'r') as f:
+            try:
+                data = jstyleson.load(f)
+            except ValueError as e:
+                raise ConfigError(f'{path}: not a valid jsonc file ({e})') from e
+        entry = (version, data)
+        _CACHE[key] = entry
+    return copy.deepcopy(entry[1])
+
+
+def clear_cache():
+    _CACHE.clear()
+
+
+# Schemas: field -> (kind, options)
+#   number: real value, options "positive", "nonnegative"
+#   integer: options "choices"
+#   vector: options "size"
+#   matrix: options "shape"
+#   string: options "choices"
+#   list: list of dicts
+#   object: dict, checked by the module that uses it
+AIRCRAFT_SCHEMA = {
+    "m": ("number", {"positive": True}),
+    "inertia_matrix": ("matrix", {"shape": (3, 3)}),
+    "s": ("number", {"positive": True}),
+    "mac": ("number", {"positive": True}),
+    "x_apt1": ("number", {}),
+    "y_apt1": ("number", {}),
+    "z_apt1": ("number", {}),
+    "x_apt2": ("number", {}),
+    "y_apt2": ("number", {}),
+    "z_apt2": ("number", {}),
+    "alpha_0": ("number", {}),
+    "n": ("number", {}),
+    "s_t": ("number", {"positive": True}),
+    "l_t": ("number", {"positive": True}),
+}
+
+AIRCRAFT_OPTIONAL = {
+    "aero": ("object", {}),
+}
+
+SIMULATION_SCHEMA = {
+    "X": ("vector", {"size": 9}),
+    "U": ("vector", {"size": 5}),
+    "time": ("number", {"positive": True}),
+    "dt": ("number", {"positive": True}),
+    "da": ("number", {}),
+    "da_start": ("number", {"nonnegative": True}),
+    "da_end": ("number", {"nonnegative": True}),
+    "eg_time": ("number", {"nonnegative": True}),
+    "eg": ("integer", {"choices": [0, 1, 2, 3]}),
+    "show": ("integer", {"choices": [0, 1]}),
+}
+
+SIMULATION_OPTIONAL = {
+    "integrator": ("string", {"choices": list(INTEGRATORS)}),
+    "rtol": ("number", {"positive": True}),
+    "atol": ("number", {"positive": True}),
+    "backend": ("string", {"choices": ["numpy", "numba"]}),
+    "events": ("list", {}),
+    "position0": ("vector", {"size": 3}),
+    "atmosphere": ("object", {}),
+    "trim": ("object", {}),
+}
+
+TRIM_SCHEMA = {
+    "airspeed": ("number", {"positive": True}),
+}
+TRIM_OPTIONAL = {
+    "gamma": ("number", {}),
+    "altitude": ("number", {}),
+}
+
+UNIT_KEYS = ["units_sys", "unit_sys"]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and np.isfinite(value)
+
+
+def _check(name, value, kind, options):
+    """
+    Problem of one value, None if it is right
+    """
+    if kind == "number":
+        if not _is_number(value):
+            return f'"{name}" has to be a number, got {value!r}'
+        if options.get("positive") and value <= 0:
+            return f'"{name}" has to be > 0, got {value}'
+        if options.get("nonnegative") and value < 0:
+            return f'"{name}" has to be >= 0, got {value}'
+    elif kind == "integer":
+        if not _is_number(value) or value != int(value):
+            return f'"{name}" has to be an integer, got {value!r}'
+        if value not in options["choices"]:
+            return f'"{name}" has to be one of {options["choices"]}, got {value}'
+    elif kind == "string":
+        if value not in options["choices"]:
+            return f'"{name}" has to be one of {options["choices"]}, got {value!r}'
+    elif kind in ("vector", "matrix"):
+        shape = (options["size"],) if kind == "vector" else options["shape"]
+        try:
+            array = np.array(value, dtype=float)
+        except (TypeError, ValueError):
+            return f'"{name}" has to be numbers with shape {shape}, got {value!r}'
+        if array.shape != shape:
+            return f'"{name}" has to have shape {shape}, got {array.shape}'
+        if not np.all(np.isfinite(array)):
+            return f'"{name}" has values that are not finite'
+    elif kind == "list":
+        if not isinstance(value, list) or not all(isinstance(v, dict) for v in value):
+            return f'"{name}" has to be a list of objects'
+    elif kind == "object":
+        if not isinstance(value, dict):
+            return f'"{name}" has to be an object'
+    return None
+
+
+def units(data):
+    """
+    Unit system of a config, both keys (units_sys, unit_sys) are accepted
+    """
+    found = {key: data[key] for key in UNIT_KEYS if key in data}
+    if len(set(found.values())) > 1:
+        raise ConfigError(f'units_sys and unit_sys do not agree: {found}')
+    unit_system = next(iter(found.values()), None)
+    if unit_system not in SUPPORTED_UNITS:
+        raise ConfigError(f'{unit_system} NOT IS SUPPORTED, use one of {SUPPORTED_UNITS}')
+    return unit_system
+
+
+def validate(data, schema, optional=None, source=None):
+    """
+    Check a parsed config against a schema, raise a ConfigError with every
+    problem found. Unknown fields only give a warning.
+    """
+    where = f'{source}: ' if source else ''
+    if not isinstance(data, dict):
+        raise ConfigError(f'{where}the config has to be an object, got {type(data).__name__}')
+    optional = optional or {}
+    try:
+        units(data)
+    except ConfigError as e:
+        raise ConfigError(f'{where}{e}') from None
+    errors = []
+    for name, (kind, options) in schema.items():
+        if name not in data:
+            errors.append(f'missing field "{name}"')
+            continue
+        error = _check(name, data[name], kind, options)
+        if error is not None:
+            errors.append(error)
+    for name, (kind, options) in optional.items():
+        if name in data:
+            error = _check(name, data[name], kind, options)
+            if error is not None:
+                errors.append(error)
+    if errors:
+        raise ConfigError(where + "; ".join(errors))
+    unknown = set(data) - set(schema) - set(optional) - set(UNIT_KEYS)
+    if unknown:
+        warnings.warn(f'{where}unknown fields {sorted(unknown)} are ignored')
+
+
+def validate_aircraft(data, source=None):
+    validate(data, AIRCRAFT_SCHEMA, AIRCRAFT_OPTIONAL, source=source)
+    if "aero" in data:
+        from core.aero_database import aero_from_dict
+        where = f'{source}: ' if source else ''
+        try:
+            aero_from_dict(data["aero"])
+        except (TypeError, ValueError) as e:
+            raise ConfigError(f'{where}aero: {e}') from None
+
+
+def validate_simulation(data, source=None):
+    validate(data, SIMULATION_SCHEMA, SIMULATION_OPTIONAL, source=source)
+    where = f'{source}: ' if source else ''
+    if data["dt"] > data["time"]:
+        raise ConfigError(f'{where}"dt" ({data["dt"]}) is bigger than "time" ({data["time"]})')
+    if data["da"] != 0 and data["da_end"] < data["da_start"]:
+        raise ConfigError(f'{where}"da_end" ({data["da_end"]}) is before "da_start" ({data["da_start"]})')
+    from core.control_schedule import event_from_dict
+    for i, event in enumerate(data.get("events", [])):
+        try:
+            event_from_dict(event)
+        except (TypeError, ValueError) as e:
+            raise ConfigError(f'{where}events[{i}]: {e}') from None
+    if "atmosphere" in data:
+        from core.atmosphere import atmosphere_from_dict
+        try:
+            atmosphere_from_dict(data["atmosphere"])
+        except (TypeError, ValueError) as e:
+            raise ConfigError(f'{where}atmosphere: {e}') from None
+    if "trim" in data:
+        trim = data["trim"]
+        unknown = set(trim) - set(TRIM_SCHEMA) - set(TRIM_OPTIONAL)
+        problems = [f'unknown fields {sorted(unknown)}'] if unknown else []
+        for name, (kind, options) in TRIM_SCHEMA.items():
+            if name not in trim:
+                problems.append(f'"{name}" is missing')
+        for name, (kind, options) in {**TRIM_SCHEMA, **TRIM_OPTIONAL}.items():
+            if name in trim:
+                problem = _check(name, trim[name], kind, options)
+                if problem:
+                    problems.append(problem)
+        if problems:
+            raise ConfigError(f'{where}trim: ' + "; ".join(problems))
@@ -2,76 +2,143 @@
 
 from domain.aircraft_parameter import AircraftParameters
 from domain.simulation_config import SimulationParameters
+from service import binary_format
+from service import config
+from service import mesh_cache
+from service.mesh_cache import MeshCache
+import os
 import numpy as np
-import jstyleson
-import pandas as pd
-import pyvista  as pv
+# pandas, pyvista and jstyleson are imported by the functions that use them,
+# a headless run only needs numpy
 class LoadFiles:
     """
     Load files
     """
     @staticmethod
-    def ac_parameters(data):
-        supported_units = ["SI"]
-        # Check units system
-        unit_system = data.get("unit_sys")
-        if unit_system not in supported_units:
-            raise ValueError(f'{unit_system} NOT IS SUPPORTED')
-        else:
-            fields = [
-            "m", "inertia_matrix", "s", "mac", "x_apt1", "y_apt1", "z_apt1", 
+    def aircraft(path):
+        """
+        AircraftParameters of a jsonc file (parsed once, validated)
+        """
+        return LoadFiles.ac_parameters(LoadFiles._read_jsonc(path),source=path)
+    @staticmethod
+    def simulation(path):
+        """
+        SimulationParameters of a jsonc file (parsed once, validated)
+        """
+        return LoadFiles.simulation_parameters(LoadFiles._read_jsonc(path),source=path)
+    @staticmethod
+    def ac_parameters(data,source=None):
+        """
+        source: name of the file, for the error messages
+
+        Raise config.ConfigError (a ValueError) if the config is not valid
+        """
+        config.validate_aircraft(data,source)
+        fields = [
+            "m", "inertia_matrix", "s", "mac", "x_apt1", "y_apt1", "z_apt1",
             "x_apt2", "y_apt2", "z_apt2", "alpha_0", "n", "s_t", "l_t"
-            ]
-            values = {}
-            # Load parameters
-            for i in fields:
-                if i == "inertia_matrix":
-                    values[i] = np.array(data[i])
-                else:
-                    values[i] = data[i]
-            return AircraftParameters(**values)
+        ]
+        # Optional fields, AircraftParameters defaults are used if missing
+        optional_fields = ["aero"]
+        values = {}
+        # Load parameters
+        for i in fields:
+            if i == "inertia_matrix":
+                values[i] = np.array(data[i])
+            else:
+                values[i] = data[i]
+        for i in optional_fields:
+            if i in data:
+                values[i] = data[i]
+        return AircraftParameters(**values)
 
     @staticmethod
-    def simulation_parameters(data):
-        supported_units = ["SI"]
-        # Check units system
-        unit_system = data.get("units_sys")
-        if unit_system not in supported_units:
-            raise ValueError(f'{unit_system} NOT IS SUPPORTED')
-        else:
-            fields = ["X","U","time","dt","da","da_start","da_end","eg_time","eg","show"]
-            values = {}
-            for i in fields:
-                if i == "X" or i == "U":
-                    values[i] = np.array(data[i])
-                else:
-                    values[i] = data[i]
-            return SimulationParameters(**values)
+    def simulation_parameters(data,source=None):
+        """
+        source: name of the file, for the error messages
+
+        Raise config.ConfigError (a ValueError) if the config is not valid
+        """
+        config.validate_simulation(data,source)
+        fields = ["X","U","time","dt","da","da_start","da_end","eg_time","eg","show"]
+        # Optional fields, SimulationParameters defaults are used if missing
+        optional_fields = ["integrator","rtol","atol","backend","events","position0","atmosphere","trim"]
+        values = {}
+        for i in fields:
+            if i == "X" or i == "U":
+                values[i] = np.array(data[i],dtype=float)
+            else:
+                values[i] = data[i]
+        for i in optional_fields:
+            if i == "position0" and i in data:
+                values[i] = np.array(data[i],dtype=float)
+            elif i in data:
+                values[i] = data[i]
+        return SimulationParameters(**values)
     @staticmethod
     def _load_states(path):
         """
-        Load states from csv file
+        Load states from csv file, or from the binary format (.simb)
         """
+        if path.endswith("." + binary_format.EXTENSION):
+            return LoadFiles._load_states_bin(path)[0]
+        import pandas as pd
         df = pd.read_csv(path)
         states = df.values
         return states
     @staticmethod
+    def _load_states_bin(path,mmap=True):
+        """
+        Load states from the binary format (.simb)
+
+        mmap: if True the states are a read only np.memmap, rows are read
+        from disk only when they are used, e.g. by slicing a time window.
+
+        Output: (states, meta) with meta the header of the file (columns, dt,
+        aircraft, simulation)
+        """
+        meta,offset = binary_format.read_header(path)
+        n_cols = len(meta["columns"])
+        n_rows = (os.path.getsize(path) - offset)//(binary_format.DTYPE.itemsize*n_cols)
+        if mmap:
+            states = np.memmap(path,dtype=binary_format.DTYPE,mode="r",offset=offset,shape=(n_rows,n_cols))
+        else:
+            with open(path,"rb") as f:
+                f.seek(offset)
+                states = np.fromfile(f,dtype=binary_format.DTYPE,count=n_rows*n_cols).reshape(n_rows,n_cols)
+        return states,meta
+    @staticmethod
+    def time_window(states,t_start,t_end,dt=None):
+        """
+        Rows of states with t_start <= time <= t_end (time is the last column).
+
+        With dt (uniform time step) the rows are found from the first time
+        only, a memory-mapped file is not read outside the window.
+        """
+        if dt is None:
+            time = np.asarray(states[:,-1])
+            i0 = np.searchsorted(time,t_start,side="left")
+            i1 = np.searchsorted(time,t_end,side="right")
+        else:
+            t0 = float(states[0,-1])
+            i0 = max(int(np.ceil((t_start - t0)/dt - 1e-9)),0)
+            i1 = max(int(np.floor((t_end - t0)/dt + 1e-9)) + 1,0)
+        return states[i0:i1]
+    @staticmethod
     def _load_mesh(path):
-        mesh = pv.read(path)
-        center = mesh.center
-        bounds = mesh.bounds
-        scale = max(
-            bounds[1] - bounds[0],
-            bounds[3] - bounds[2],
-            bounds[5] - bounds[4]
-        )
-        mesh.points -= center
-        mesh.points /= scale
-        return mesh
+        """
+        Mesh centered and scaled so the largest side is 1, cached in
+        data/mesh_cache after the first read (see service/mesh_cache.py)
+        """
+        return MeshCache().load(path)[0]
+    @staticmethod
+    def _load_mesh_lods(path,levels=mesh_cache.LEVELS):
+        """
+        Normalized mesh and its decimated levels of detail, finest first
+        """
+        return MeshCache().load(path,levels)
     @staticmethod
     def _read_jsonc(path):
-        # Read parameters
-        with open(path,'r') as f:
-            data = jstyleson.load(f)
-        return data
+        # Read parameters, cached by path and modification time
+        return config.read_jsonc(path)
 
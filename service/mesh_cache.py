@@ -0,0 +1,84 @@
+import hashlib
+import os
+import numpy as np
+
+CACHE_DIR = "data/mesh_cache"
+# Fraction of the triangles kept in each level of detail, finest first
+LEVELS = (1.0, 0.5, 0.25, 0.1)
+
+
+class MeshCache:
+    """
+    Normalized meshes (centered, largest side 1) and their decimated levels
+    of detail, saved as .npz (points and faces of each level) so a mesh is
+    read and decimated with pyvista only the first time. The key is the
+    path, the modification time and the size of the source file and the
+    levels, an edited file is processed again.
+
+        lods = MeshCache().load("data/meshes/ultimo2.stl")  # finest first
+    """
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, path, levels):
+        stat = os.stat(path)
+        text = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{list(levels)}"
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{key}.npz")
+
+    @staticmethod
+    def normalize(points):
+        """
+        Points centered in the bounding box and scaled so the largest side is 1
+        """
+        points = np.asarray(points, dtype=float)
+        low = points.min(axis=0)
+        high = points.max(axis=0)
+        scale = float(np.max(high - low)) or 1.0
+        return (points - (low + high)/2)/scale
+
+    @staticmethod
+    def _build(path, levels):
+        """
+        Read and decimate the source mesh, Output: [(points, faces), ...]
+        """
+        import pyvista as pv
+        mesh = pv.read(path)
+        if not isinstance(mesh, pv.PolyData):
+            mesh = mesh.extract_surface()
+        mesh = mesh.triangulate()
+        mesh.points = MeshCache.normalize(mesh.points)
+        arrays = []
+        for fraction in levels:
+            if fraction >= 1.0:
+                level = mesh
+            else:
+                level = mesh.decimate(1.0 - fraction)
+            arrays.append((np.asarray(level.points, dtype=np.float32), np.asarray(level.faces)))
+        return arrays
+
+    def arrays(self, path, levels=LEVELS):
+        """
+        [(points, faces), ...] of every level, from the cache if it is there
+        """
+        cache_path = self._path(path, levels)
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                return [(data[f"points_{i}"], data[f"faces_{i}"]) for i in range(len(levels))]
+        arrays = self._build(path, levels)
+        os.makedirs(self.directory, exist_ok=True)
+        values = {}
+        for i, (points, faces) in enumerate(arrays):
+            values[f"points_{i}"] = points
+            values[f"faces_{i}"] = faces
+        tmp = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, levels=np.asarray(levels), **values)
+        os.replace(tmp, cache_path)
+        return arrays
+
+    def load(self, path, levels=LEVELS):
+        """
+        pyvista meshes of every level, finest first
+        """
+        import pyvista as pv
+        return [pv.PolyData(points.astype(float), faces) for points, faces in self.arrays(path, levels)]
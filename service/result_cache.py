@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from core.aircraft_model import MODEL_VERSION
+from service import binary_format
+
+CACHE_DIR = "data/result_cache"
+
+
+class ResultCache:
+    """
+    On-disk cache of Simulate.simulate outputs, content addressed: the key is
+    a hash of the aircraft parameters, the simulation parameters, the output
+    columns and MODEL_VERSION, so changing any of them is a miss. The backend
+    is left out of the key: numpy and numba give the same states (checked by
+    tests/test_compiled_parity.py), so a run of one backend is a hit for the
+    other.
+
+    Each result is a .simb file (see service/binary_format.py). When the
+    directory grows over max_bytes the least recently used files are deleted.
+
+        cache = ResultCache()
+        states = Simulate(ac_params, sim_params, cache=cache).simulate()
+    """
+    def __init__(self, directory=CACHE_DIR, max_bytes=512*2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(ac_params, sim_params, columns):
+        text = json.dumps({
+            "model": MODEL_VERSION,
+            "aircraft": ac_params.digest(),
+            "simulation": sim_params.digest(ignore=("backend",)),
+            "columns": list(columns),
+        }, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{binary_format.EXTENSION}")
+
+    def get(self, ac_params, sim_params, columns):
+        """
+        Cached states (read in memory), None on a miss
+        """
+        path = self._path(self.key(ac_params, sim_params, columns))
+        try:
+            meta, offset = binary_format.read_header(path)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                states = np.fromfile(f, dtype=binary_format.DTYPE)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        n_cols = len(meta["columns"])
+        if n_cols == 0 or len(states) % n_cols:
+            # Truncated file, compute again
+            self.misses += 1
+            return None
+        os.utime(path) # mark as recently used
+        self.hits += 1
+        return states.reshape(-1, n_cols).astype(float)
+
+    def put(self, ac_params, sim_params, columns, states):
+        """
+        Save states, written to a temporary file and renamed so a reader never
+        sees half a file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.key(ac_params, sim_params, columns))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        meta = {
+            "columns": list(columns),
+            "dt": sim_params.dt,
+            "model": MODEL_VERSION,
+            "aircraft": ac_params.to_dict(),
+            "simulation": sim_params.to_dict(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(tmp, "wb") as f:
+            binary_format.write_header(f, meta)
+            f.write(np.ascontiguousarray(states, dtype=binary_format.DTYPE).tobytes())
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def entries(self):
+        """
+        (last use time, size, path) of the cached files, oldest first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith("." + binary_format.EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Delete the least recently used files until the cache fits in max_bytes
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
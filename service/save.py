@@ -1,12 +1,143 @@
-import pandas as pd
+import os
+import numpy as np
 from datetime import datetime
+from core.simulation import Simulate
+from service import binary_format
+
+OUTPUT_DIR = "data/simulations_output"
+
 class Save:
     @staticmethod
-    def s_sim(states):
+    def _open_unique(directory,extension,mode="x",prefix="simulation_data"):
+        """
+        Create a new output file <prefix>_<date>_<time>.<extension>,
+        a counter is added if the name is taken. The file is created with
+        exclusive mode, so two runs never write the same file.
+
+        Output: (opened file, path)
+        """
+        os.makedirs(directory,exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        counter = 0
+        while True:
+            suffix = f"_{counter}" if counter else ""
+            path = os.path.join(directory,f"{prefix}_{stamp}{suffix}.{extension}")
+            try:
+                if "b" in mode:
+                    return open(path,mode),path
+                return open(path,mode,newline=""),path
+            except FileExistsError:
+                counter += 1
+    @staticmethod
+    def _columns(n_cols):
+        """
+        Column names of a states matrix produced by Simulate
+        """
+        return Simulate.columns_of(n_cols)
+    @staticmethod
+    def s_sim(states,columns=None,directory=OUTPUT_DIR):
         """
         States have to be array 9xN
         shorted u,v,w,p,q,r,phi,theta,psi,time
+        (or with alpha,beta,gamma before time, see Simulate.columns)
+
+        Output: path of the csv file, unique for each run
+        """
+        if columns is None:
+            columns = Save._columns(states.shape[1])
+        import pandas as pd
+        df = pd.DataFrame(states, columns=columns)
+        f,path = Save._open_unique(directory,"csv")
+        with f:
+            df.to_csv(f, index=False)
+        return path
+    @staticmethod
+    def _meta(columns,dt,ac_params,sim_params):
+        """
+        Header of the binary format
+        """
+        if dt is None and sim_params is not None:
+            dt = sim_params.dt
+        return {
+            "columns": list(columns),
+            "dt": dt,
+            "aircraft": None if ac_params is None else ac_params.to_dict(),
+            "simulation": None if sim_params is None else sim_params.to_dict(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+    @staticmethod
+    def s_bin(states,columns=None,ac_params=None,sim_params=None,dt=None,directory=OUTPUT_DIR):
+        """
+        Save the states in the binary format (.simb, see service/binary_format.py),
+        float64 without loss of precision, with a header holding the column
+        names, dt and the aircraft and simulation parameters.
+        Read it back with LoadFiles._load_states_bin (memory-mapped).
+
+        Output: path of the file, unique for each run
+        """
+        if columns is None:
+            columns = Save._columns(states.shape[1])
+        if dt is None and sim_params is None and len(states) > 1:
+            dt = float(states[1,-1] - states[0,-1])
+        f,path = Save._open_unique(directory,binary_format.EXTENSION,mode="xb")
+        with f:
+            binary_format.write_header(f,Save._meta(columns,dt,ac_params,sim_params))
+            f.write(np.ascontiguousarray(states,dtype=binary_format.DTYPE).tobytes())
+        return path
+    @staticmethod
+    def s_stream(blocks,columns=None,directory=OUTPUT_DIR,fmt="csv",ac_params=None,sim_params=None,
+                 prefix="simulation_data"):
+        """
+        Write the blocks of states of Simulate.simulate_iter to a file as
+        they arrive, only one block is in memory at a time.
+
+        fmt: "csv" or "simb" (binary format, see Save.s_bin)
+        prefix: start of the file name
+
+        Output: path of the file, unique for each run
+
+        If the blocks raise (the simulation fails mid run) the partial file
+        is deleted before the error is raised again.
+        """
+        if fmt == binary_format.EXTENSION:
+            f,path = Save._open_unique(directory,fmt,mode="xb",prefix=prefix)
+            try:
+                with f:
+                    for block in blocks:
+                        if f.tell() == 0:
+                            if columns is None:
+                                columns = Save._columns(block.shape[1])
+                            dt = None
+                            if sim_params is None and len(block) > 1:
+                                dt = float(block[1,-1] - block[0,-1])
+                            binary_format.write_header(f,Save._meta(columns,dt,ac_params,sim_params))
+                        f.write(np.ascontiguousarray(block,dtype=binary_format.DTYPE).tobytes())
+            except BaseException:
+                Save._remove_partial(path)
+                raise
+            return path
+        if fmt != "csv":
+            raise ValueError(f'{fmt} NOT IS SUPPORTED')
+        import pandas as pd
+        f,path = Save._open_unique(directory,"csv",prefix=prefix)
+        try:
+            with f:
+                for block in blocks:
+                    if columns is None:
+                        columns = Save._columns(block.shape[1])
+                    pd.DataFrame(block,columns=columns).to_csv(
+                        f, index=False, header=f.tell() == 0
+                    )
+        except BaseException:
+            Save._remove_partial(path)
+            raise
+        return path
+    @staticmethod
+    def _remove_partial(path):
+        """
+        Delete the file of a failed stream, no orphan outputs are left
         """
-        date = datetime.now().strftime("%Y%m%d")
-        df = pd.DataFrame(states, columns=["u","v","w","p","q","r","phi","theta","psi","time"])
-        df.to_csv(f"data/simulations_output/simulation_data_{date}.csv", index=False)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
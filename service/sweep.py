@@ -0,0 +1,105 @@
+import itertools
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from core.aero_database import aero_from_dict
+from core.simulation import Simulate
+from domain.aircraft_parameter import AircraftParameters
+from domain.simulation_config import SimulationParameters
+from domain.sweep_result import SweepResults
+from service.loader import LoadFiles
+
+AC_FIELDS = {f.name for f in dataclasses.fields(AircraftParameters)}
+SIM_FIELDS = {f.name for f in dataclasses.fields(SimulationParameters)}
+
+
+def _run_case(ac_params, sim_params, return_abg):
+    """
+    Worker, run one case. Parameters arrive pickled, so every process owns its copy.
+    """
+    return Simulate(ac_params, sim_params).simulate(return_abg=return_abg)
+
+
+class Sweep:
+    """
+    Run the same simulation over a grid of parameter overrides
+    """
+    @staticmethod
+    def cases(grid):
+        """
+        Expand a grid into a list of cases
+
+        grid: dict field -> list of values, all the combinations are used
+            grid = {"m": [120e3, 240e3, 60e3], "dt": [0.1, 0.05]} -> 6 cases
+        or a list of dicts with the overrides of each case
+            grid = [{"m": 120e3}, {"m": 240e3, "n": 5.0}]
+        each case can start from its own equilibrium with a trim override
+            grid = {"m": [120e3, 240e3], "trim": [{"airspeed": 80}, {"airspeed": 100}]}
+        """
+        if isinstance(grid, dict):
+            keys = list(grid)
+            return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+        return [dict(case) for case in grid]
+
+    @staticmethod
+    def apply(ac_params, sim_params, case):
+        """
+        New AircraftParameters and SimulationParameters with the overrides of
+        the case, the inputs are not modified. An override of a field without
+        effect (AeroDatabase.unused_parameters of an aircraft with aero
+        tables) raises ValueError.
+        """
+        ac_over = {}
+        sim_over = {}
+        for key, value in case.items():
+            if key in AC_FIELDS:
+                ac_over[key] = value
+            elif key in SIM_FIELDS:
+                sim_over[key] = value
+            else:
+                raise ValueError(f'{key} NOT IS A PARAMETER of the aircraft or the simulation')
+        for key in ("inertia_matrix", "X", "U"):
+            if key in ac_over:
+                ac_over[key] = np.array(ac_over[key], dtype=float)
+            if key in sim_over:
+                sim_over[key] = np.array(sim_over[key], dtype=float)
+        ac_params = dataclasses.replace(ac_params, **ac_over)
+        aero = aero_from_dict(getattr(ac_params, "aero", None))
+        if aero is not None:
+            unused = [key for key in ac_over if key in aero.unused_parameters()]
+            if unused:
+                raise ValueError(f'{unused} have no effect with the aero tables of the aircraft')
+        return ac_params, dataclasses.replace(sim_params, **sim_over)
+
+    @staticmethod
+    def run(ac_params, sim_params, grid, max_workers=None, return_abg=False):
+        """
+        Simulate every case of the grid in a process pool
+
+        Input:
+            ac_params: AircraftParameters, or path to the aircraft jsonc
+            sim_params: SimulationParameters, or path to the simulation jsonc
+            grid: overrides, see Sweep.cases
+            max_workers: processes of the pool, None uses all the cores and
+            1 runs the cases in this process
+            return_abg: passed to Simulate.simulate
+
+        Output:
+            SweepResults with the cases and the states of each one, in the
+            order of Sweep.cases(grid)
+        """
+        if isinstance(ac_params, str):
+            ac_params = LoadFiles.aircraft(ac_params)
+        if isinstance(sim_params, str):
+            sim_params = LoadFiles.simulation(sim_params)
+        cases = Sweep.cases(grid)
+        jobs = [Sweep.apply(ac_params, sim_params, case) for case in cases]
+        ac_list = [job[0] for job in jobs]
+        sim_list = [job[1] for job in jobs]
+        abg_list = [return_abg]*len(jobs)
+        if max_workers == 1:
+            states = list(map(_run_case, ac_list, sim_list, abg_list))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                states = list(executor.map(_run_case, ac_list, sim_list, abg_list))
+        return SweepResults(cases=cases, states=states, columns=Simulate.columns(return_abg))
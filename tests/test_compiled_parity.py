@@ -0,0 +1,32 @@
+"""
+Parity of the compiled (numba) backend against the numpy reference path.
+"""
+import dataclasses
+import os
+import warnings
+
+import numpy as np
+import pytest
+
+from core import compiled
+from core.simulation import Simulate
+from service.loader import LoadFiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AIRCRAFTS = ["aircraft.jsonc", "b737.jsonc"] # equations and aero tables
+SIMULATION = os.path.join(ROOT, "configs", "simulation", "sim_da.jsonc")
+
+pytestmark = pytest.mark.skipif(not compiled.NUMBA_AVAILABLE, reason="numba is not installed")
+
+
+@pytest.mark.parametrize("aircraft", AIRCRAFTS)
+@pytest.mark.parametrize("integrator", list(compiled.METHODS))
+def test_numba_matches_numpy(aircraft, integrator):
+    ac_params = LoadFiles.aircraft(os.path.join(ROOT, "configs", "aircrafts", aircraft))
+    sim_params = dataclasses.replace(LoadFiles.simulation(SIMULATION), show=0, integrator=integrator)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error") # a silent fallback to numpy would make the test trivial
+        numba_states = Simulate(ac_params, dataclasses.replace(sim_params, backend="numba")).simulate()
+    numpy_states = Simulate(ac_params, dataclasses.replace(sim_params, backend="numpy")).simulate()
+    assert numba_states.shape == numpy_states.shape
+    assert np.allclose(numba_states, numpy_states, rtol=1e-9, atol=1e-9)
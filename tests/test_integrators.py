@@ -0,0 +1,44 @@
+"""
+Failure modes of the adaptive integrator: a diverging run has to raise, not
+crawl with a tiny step.
+"""
+import numpy as np
+import pytest
+
+from core.integrators import DormandPrince45
+
+
+def blow_up(t, x):
+    # x' = x**2, x(0) = 1 -> x = 1/(1 - t), infinite at t = 1
+    return x**2
+
+
+def test_rk45_raises_under_the_minimum_step():
+    time_grid = np.arange(21)*0.1
+    with pytest.raises(FloatingPointError, match="minimum"):
+        list(DormandPrince45().integrate(blow_up, np.ones(1), time_grid))
+
+
+def test_rk45_raises_over_the_step_budget():
+    time_grid = np.arange(21)*0.1
+    with pytest.raises(FloatingPointError, match="budget"):
+        list(DormandPrince45(max_steps=5).integrate(blow_up, np.ones(1), time_grid))
+
+
+def test_rk45_smooth_run_is_accurate():
+    time_grid = np.arange(11)*0.05
+    states = list(DormandPrince45(rtol=1e-9, atol=1e-12).integrate(blow_up, np.ones(1), time_grid))
+    assert np.allclose(np.ravel(states), 1/(1 - time_grid[1:]), rtol=1e-6)
+
+
+def test_rk45_batch_stops_the_diverging_sample():
+    # Row 0 blows up at t = 1, row 1 (x = 1/(10 - t)) has to stay accurate
+    time_grid = np.arange(21)*0.1
+    x0 = np.array([[1.0], [0.1]])
+    integrator = DormandPrince45(rtol=1e-9, atol=1e-12)
+    states = np.array(list(integrator.integrate(
+        blow_up, x0, time_grid, freeze=lambda x: np.abs(x[:, 0]) > 1e6
+    )))
+    assert integrator.frozen.tolist() == [True, False]
+    assert np.all(np.isfinite(states))
+    assert np.allclose(states[:, 1, 0], 1/(10 - time_grid[1:]), rtol=1e-6)
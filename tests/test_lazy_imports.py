@@ -0,0 +1,51 @@
+"""
+Batch workers and the CLI have to start fast: the optional heavy packages
+are only imported by the code paths that use them.
+"""
+import os
+import subprocess
+import sys
+import importlib.util
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after(code):
+    """
+    Heavy modules in sys.modules after running code in a fresh interpreter
+    """
+    script = code + "\nimport sys\nprint(' '.join(m for m in ('numba', 'llvmlite', 'pandas', 'pyvista') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1].split() if result.stdout.strip() else []
+
+
+@pytest.mark.parametrize("module", ["core.simulation", "service.batch", "service.loader", "cli"])
+def test_import_does_not_load_heavy_packages(module):
+    assert loaded_after(f"import {module}") == []
+
+
+def test_numpy_run_does_not_load_numba():
+    code = (
+        "import dataclasses\n"
+        "from service.loader import LoadFiles\n"
+        "from core.simulation import Simulate\n"
+        "ac = LoadFiles.aircraft('configs/aircrafts/aircraft.jsonc')\n"
+        "sim = LoadFiles.simulation('configs/simulation/simulation.jsonc')\n"
+        "Simulate(ac, dataclasses.replace(sim, show=0, time=1.0, backend='numpy')).simulate()\n"
+    )
+    assert "numba" not in loaded_after(code)
+
+
+@pytest.mark.skipif(importlib.util.find_spec("numba") is None, reason="numba is not installed")
+def test_numba_run_loads_numba():
+    code = (
+        "import dataclasses\n"
+        "from service.loader import LoadFiles\n"
+        "from core.simulation import Simulate\n"
+        "ac = LoadFiles.aircraft('configs/aircrafts/aircraft.jsonc')\n"
+        "sim = LoadFiles.simulation('configs/simulation/simulation.jsonc')\n"
+        "Simulate(ac, dataclasses.replace(sim, show=0, time=1.0, backend='numba')).simulate()\n"
+    )
+    assert "numba" in loaded_after(code)